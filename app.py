@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 import requests
 #import functions
 import openai
@@ -6,22 +6,44 @@ import json
 import os
 import sys
 import time
+import queue
+import threading
+import hmac
+import hashlib
 from datetime import datetime, timedelta, timezone
 from googleapiclient.discovery import build
 from dotenv import load_dotenv
 
 from services.GoogleCalendar import GoogleCalendarManager
 from services.AirTable import AirtablePATManager
+from services.AirtableMirror import AirtableMirror
+from services.CalendarMirror import CalendarMirror
 from services.Gmail import GmailManager
 from services.GoogleDocs import GoogleDocsManager
 from services.WhatsApp import WhatsApp_Manager
+from services.AssistantRun import AssistantRunManager
+from services.ServiceRegistry import ServiceRegistry
+from services.ToolExecutor import ToolExecutor
+from services.WebhookQueue import WebhookQueue
+from services.ThreadScheduler import ThreadScheduler
+from services.ThreadIndex import ThreadIndex
+from services.ClientCache import normalizar_telefono
+from services.RateLimiter import RateLimiter
+from services.WriteBehind import WriteBehindQueue
+from services.Availability import AvailabilityEngine
+from services.Metrics import metrics, medir
+from services.Logger import configurar_logging, get_logger
 
 app = Flask(__name__)
 
 load_dotenv()
 
+configurar_logging()
+logger = get_logger(__name__)
+
 openai.api_key = os.getenv("OPENAI_API_KEY")
 VERIFY_TOKEN = os.getenv("VERIFY_TOKEN")
+APP_SECRET = os.getenv("APP_SECRET")
 PHONE_NUMBER_ID = os.getenv("PHONE_NUMBER_ID")
 ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
 WHATSAPP_BUSINESS_ID = '439452585928337'
@@ -30,9 +52,98 @@ BASE_URL = f"https://graph.facebook.com/v16.0/{WHATSAPP_BUSINESS_ID}/messages"
 
 SCOPES = ['https://www.googleapis.com/auth/calendar.readonly']
 
+# Tiempo total máximo (segundos) para responder un mensaje y respuesta de respaldo si se excede
+ASSISTANT_LATENCY_BUDGET = float(os.getenv("ASSISTANT_LATENCY_BUDGET", "60"))
+FALLBACK_REPLY = os.getenv(
+    "FALLBACK_REPLY",
+    "Lo siento, estoy tardando más de lo esperado en responder. ¿Podrías intentarlo de nuevo en unos momentos?",
+)
+
 #creds = functions.authenticate_google()
 
-user_threads = {}
+# Índice persistente teléfono / id_cliente -> hilo y cursor del último mensaje visto por hilo
+thread_index = ThreadIndex(os.getenv("THREAD_INDEX_PATH", "thread_index.db"))
+
+# Límite de solicitudes por base de Airtable compartido entre workers
+# (Airtable permite 5 por segundo; se deja margen para la variación de la red)
+limitador_airtable = RateLimiter(
+    os.getenv("RATE_LIMIT_PATH", "rate_limit.db"),
+    rate=float(os.getenv("AIRTABLE_RPS", "4.5")),
+)
+
+# Espejo local de Clientes/Usuarios para atender consultas sin ir a Airtable (AIRTABLE_READ_MODE=mirror)
+espejo_airtable = None
+if os.getenv("AIRTABLE_READ_MODE", "airtable") == "mirror":
+    espejo_airtable = AirtableMirror(
+        os.getenv("AIRTABLE_MIRROR_PATH", "airtable_mirror.db"),
+        interval=float(os.getenv("AIRTABLE_MIRROR_INTERVAL", "60")),
+    )
+
+# Espejo local del calendario de citas sincronizado con syncToken (CALENDAR_READ_MODE=mirror)
+espejo_calendario = None
+if os.getenv("CALENDAR_READ_MODE", "google") == "mirror":
+    espejo_calendario = CalendarMirror(
+        os.getenv("CALENDAR_MIRROR_PATH", "calendar_mirror.db"),
+        interval=float(os.getenv("CALENDAR_MIRROR_INTERVAL", "60")),
+    )
+
+# Disponibilidad de la agenda en memoria, refrescada en segundo plano con freebusy;
+# se asocia al gestor del calendario al construirlo
+motor_disponibilidad = AvailabilityEngine(
+    horizon_days=int(os.getenv("AVAILABILITY_HORIZON_DAYS", "14")),
+    refresh_interval=float(os.getenv("AVAILABILITY_REFRESH_INTERVAL", "60")),
+)
+
+# Escritura diferida de actualizar_cliente (AIRTABLE_WRITE_BEHIND=1)
+escritura_diferida = None
+if os.getenv("AIRTABLE_WRITE_BEHIND", "0") == "1":
+    escritura_diferida = WriteBehindQueue(
+        os.getenv("WRITE_BEHIND_PATH", "write_behind.db"),
+        interval=float(os.getenv("WRITE_BEHIND_INTERVAL", "2")),
+    )
+
+# Gestores compartidos por worker; se construyen en el primer uso
+servicios = ServiceRegistry()
+servicios.register("calendar", lambda: GoogleCalendarManager(mirror=espejo_calendario, availability=motor_disponibilidad))
+servicios.register("airtable", lambda: AirtablePATManager(
+    os.getenv("BASE_ID"),
+    os.getenv("ACCESS_TOKEN"),
+    cache_ttl=float(os.getenv("CLIENT_CACHE_TTL", "300")),
+    cache_size=int(os.getenv("CLIENT_CACHE_SIZE", "1024")),
+    rate_limiter=limitador_airtable,
+    max_wait=float(os.getenv("AIRTABLE_MAX_WAIT", "30")),
+    mirror=espejo_airtable,
+    write_behind=escritura_diferida,
+))
+servicios.register("whatsapp", lambda: WhatsApp_Manager(ACCESS_TOKEN, PHONE_NUMBER_ID))
+
+# Serialización por cliente: los mensajes que llegan juntos (o mientras hay un run activo)
+# se agrupan en un solo run. La API y el webhook comparten la llave del cliente, así que
+# nunca corren dos runs a la vez para el mismo cliente, tenga o no hilo todavía
+programador_mensajes = ThreadScheduler(
+    lambda key, items: procesar_lote_api(key, items),
+    debounce=float(os.getenv("API_DEBOUNCE", "0")),
+    max_workers=16,
+)
+programador_mensajes.register(
+    "webhook",
+    lambda phone_number, payloads: procesar_lote_webhook(phone_number, payloads),
+    debounce=float(os.getenv("WEBHOOK_DEBOUNCE", "2")),
+    max_delay=float(os.getenv("WEBHOOK_MAX_DELAY", "10")),
+)
+
+# Cola durable de mensajes recibidos por webhook, compartida entre workers
+cola_webhook = WebhookQueue(
+    os.getenv("WEBHOOK_QUEUE_PATH", "webhook_queue.db"),
+    handler=lambda payload: programador_mensajes.submit(normalizar_telefono(payload['phone_number']), payload, kind="webhook"),
+    workers=int(os.getenv("WEBHOOK_WORKERS", "2")),
+)
+
+# Ejecutor de herramientas del asistente (pool acotado, tiempo límite por herramienta)
+tool_executor = ToolExecutor(
+    max_workers=int(os.getenv("TOOL_MAX_WORKERS", "8")),
+    default_timeout=float(os.getenv("TOOL_TIMEOUT", "20")),
+)
 
 @app.route("/")
 def home():
@@ -41,6 +152,124 @@ def home():
 app = Flask(__name__)
 
 
+@app.before_request
+def iniciar_cola_webhook():
+    # Los hilos consumidores se inician en cada worker después del fork
+    cola_webhook.start()
+
+
+@app.route('/metrics', methods=['GET'])
+def exponer_metricas():
+    """
+    Histogramas de latencia por etapa en formato de texto de Prometheus,
+    agregados entre todos los workers.
+    """
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/webhook', methods=['GET'])
+def verificar_webhook():
+    """
+    Verificación del webhook de la Cloud API de WhatsApp.
+    Meta envía hub.mode, hub.verify_token y hub.challenge; se responde con el challenge
+    si el token coincide con VERIFY_TOKEN.
+    """
+    mode = request.args.get('hub.mode')
+    token = request.args.get('hub.verify_token')
+    challenge = request.args.get('hub.challenge')
+
+    if mode == 'subscribe' and VERIFY_TOKEN and token == VERIFY_TOKEN:
+        return challenge, 200
+    return jsonify({"error": "Verificación fallida"}), 403
+
+
+@app.route('/webhook', methods=['POST'])
+def recibir_webhook():
+    """
+    Recibe notificaciones de la Cloud API de WhatsApp.
+    Los mensajes de texto se encolan para procesarse en segundo plano y se
+    responde de inmediato para no exceder el tiempo límite de Meta.
+    """
+    if APP_SECRET and not firma_valida(request.get_data(), request.headers.get('X-Hub-Signature-256', '')):
+        return jsonify({"error": "Firma inválida"}), 403
+
+    body = request.get_json(silent=True) or {}
+
+    for entry in body.get('entry', []):
+        for change in entry.get('changes', []):
+            value = change.get('value', {})
+            nombres = {
+                contact.get('wa_id'): contact.get('profile', {}).get('name')
+                for contact in value.get('contacts', [])
+            }
+            for message in value.get('messages', []):
+                if message.get('type') != 'text':
+                    continue
+                cola_webhook.enqueue(message['id'], {
+                    "message_id": message['id'],
+                    "phone_number": message['from'],
+                    "name": nombres.get(message['from']),
+                    "text": message['text']['body'],
+                    "timestamp": message.get('timestamp'),
+                }, key=normalizar_telefono(message['from']))
+
+    return "EVENT_RECEIVED", 200
+
+
+def firma_valida(payload, firma):
+    """
+    Valida la firma X-Hub-Signature-256 enviada por Meta.
+
+    Args:
+        payload (bytes): Cuerpo crudo de la solicitud.
+        firma (str): Valor del encabezado X-Hub-Signature-256.
+
+    Returns:
+        bool: True si la firma coincide con APP_SECRET.
+    """
+    esperada = "sha256=" + hmac.new(APP_SECRET.encode(), payload, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(esperada, firma)
+
+
+def procesar_lote_webhook(phone_number, payloads):
+    """
+    Procesa una ráfaga de mensajes recibidos por webhook de un mismo teléfono:
+    ejecuta el asistente una sola vez y responde por WhatsApp.
+
+    Args:
+        phone_number (str): Teléfono del cliente.
+        payloads (list): Trabajos encolados con 'name' y 'text', en orden de llegada.
+    """
+    customer = {
+        "telefono_movil": phone_number,
+        "nombre_completo": payloads[-1].get('name'),
+    }
+
+    # En un reintento no se vuelven a agregar al hilo los mensajes que ya se agregaron
+    agregados = cola_webhook.added(payload['message_id'] for payload in payloads)
+    nuevos = [payload for payload in payloads if payload['message_id'] not in agregados]
+    responses = procesar_mensaje(
+        "\n".join(payload['text'] for payload in nuevos),
+        customer,
+        on_message_added=lambda message_id: cola_webhook.mark_added(
+            [payload['message_id'] for payload in nuevos], message_id
+        ),
+    )
+
+    # Respuestas del asistente posteriores al último mensaje del usuario, en orden cronológico
+    respuestas_asistente = []
+    for response in responses:
+        if response['role'] != 'assistant':
+            break
+        respuestas_asistente.append(response['content'])
+
+    whatsapp_manager = servicios.get("whatsapp")
+    for contenido in reversed(respuestas_asistente):
+        response = whatsapp_manager.send_message(phone_number, contenido)
+        if response.status_code != 200:
+            logger.error("Error al enviar respuesta por WhatsApp", extra={"ctx": {"phone_number": phone_number, "status_code": response.status_code}})
+
+
 
 @app.route('/send_whatsapp_message', methods=['POST'])
 def send_whatsapp_message():
@@ -52,7 +281,7 @@ def send_whatsapp_message():
       "message": "Mensaje de prueba"
     }
     """
-    whatsapp_manager = WhatsApp_Manager(ACCESS_TOKEN, PHONE_NUMBER_ID)
+    whatsapp_manager = servicios.get("whatsapp")
 
     body = request.get_json()
     if not body:
@@ -91,131 +320,299 @@ def asistente_bellachik():
         user_message = data['message']
         #thread_id = data['thread_id']
         customer = data['customer']  # Información del cliente enviada en el request
-        thread_id = customer.get('hilo_conversacion')
-        print(f"Mensaje del usuario ({thread_id}): {user_message}")
-        
-        #En caso de no tener thread_id, se crea un nuevo hilo
-        if not thread_id:
-            thread = openai.beta.threads.create()
-            thread_id = thread.id
-            print(f"Nuevo thread_id creado: {thread_id}")
-        
-        # Agregar el mensaje del usuario al hilo
-        openai.beta.threads.messages.create(
-            thread_id=thread_id,
-            role="user",
-            content=user_message,
-        )
-
-        # Ejecutar el asistente
-        assistant_id = os.getenv("ASSISTANT_ID")
-        run = openai.beta.threads.runs.create(
-            thread_id=thread_id,
-            assistant_id=assistant_id,
-        )
 
-        # Manejar estado del run
-        while run.status not in ("completed", "failed", "requires_action"):
-            run = openai.beta.threads.runs.retrieve(
-                thread_id=thread_id,
-                run_id=run.id,
-            )
-            
-        if run.status == "requires_action":
-            
-            tools_to_call = run.required_action.submit_tool_outputs.tool_calls
-            tool_outputs_array = []  # Array para almacenar las respuestas de las herramientas
-            
-            # Instanciar el gestor de Google Calendar
-            calendar_manager = GoogleCalendarManager()
-    
-            
-             # Configuración de Airtable        
-            base_id = os.getenv("BASE_ID")
-            access_token = os.getenv("ACCESS_TOKEN")
-
-            # Crear instancia del manejador de Airtable
-            airtable_manager = AirtablePATManager(base_id, access_token)
-            # Diccionario de mapeo de funciones
-            function_map = {
-                #Funciones para GoogleCalendar
-                
-                # Funciones para AirTable
-                "consultar_cliente": lambda intencion_cliente: format_customer_information(customer),
-                #"actualizar_cliente": lambda id_cliente, campos_actualizar: airtable_manager.actualizar_cliente(id_cliente=id_cliente,campos_actualizar=campos_actualizar),
-                "actualizar_cliente": lambda customer: airtable_manager.actualizar_cliente(
-                    id_cliente=customer.get("id_cliente"),
-                    campos_actualizar={
-                        key: value for key, value in customer.items()
-                        if key not in ["id_cliente", "hilo_conversacion"] and value
-                    }
-                )
-            }
-            
-            for tool_call in tools_to_call:
-                print(tool_call)
-                tool_name = tool_call.function.name
-                tool_arguments = json.loads(tool_call.function.arguments)  # Parsear argumentos de la herramienta
-                
-                print(f"Procesando herramienta: {tool_name}")
-                print(f"Argumentos: {tool_arguments}")
-                
-                if tool_name in function_map:
-                    # Llamar a la función mapeada dinámicamente
-                    function = function_map[tool_name]
-                    try:
-                        # Ejecutar la función con los argumentos descompuestos
-                        result = function(**tool_arguments)
-                        print("RESULT DEL LLAMDA A LA FUNCION")
-                        print(result)
-                        tool_outputs_array.append({
-                            "tool_call_id": tool_call.id,
-                            "output": json.dumps(result) 
-                        })
-                        #"output": json.dumps(result if result else {"success": True})
-                    except Exception as e:
-                        print(f"Error al ejecutar {tool_name}: {str(e)}")
-                        tool_outputs_array.append({
-                            "tool_call_id": tool_call.id,
-                            "output": json.dumps({"error": str(e)})
-                        })
-                
-                else:
-                    print(f"Herramienta desconocida: {tool_name}")
-                    tool_outputs_array.append({
-                        "tool_call_id": tool_call.id,
-                        "output": json.dumps({"error": f"Tool {tool_name} not implemented"})
-                    })
-                # Responder al asistente con la salida
-                run = openai.beta.threads.runs.submit_tool_outputs(
-                    thread_id=thread_id,
-                    run_id=run.id,
-                    tool_outputs=tool_outputs_array
-                )                
-
-        # Obtener mensajes del hilo
-        messages = openai.beta.threads.messages.list(thread_id=thread_id)
-        assistant_messages = [
-            msg.content[0].text.value
-            for msg in messages if msg.role == "assistant"
-        ]
-        #last_assistant_message = assistant_messages[-1] if assistant_messages else "No hay mensajes del asistente."
-        
-        responses = [
-            {"role": msg.role, "content": msg.content[0].text.value, "thread_id": thread_id}
-            for msg in messages
-            #Regresar el thread_id
-        ]
-        #print(responses)
+        responses = encolar_mensaje(user_message, customer, full_history=bool(data.get('full_history')))
 
         return jsonify({'status': 'success', 'messages': responses}), 200
         #return jsonify({'status': 'success', 'message': last_assistant_message, "thread_id": thread_id}), 200
 
     except Exception as e:
-        print(f'Error inesperado: {str(e)}')
+        logger.exception("Error inesperado en /asistente_bellachik")
         return jsonify({'status': 'error', 'message': f'Error inesperado: {str(e)}'}), 500
 
 
+@app.route('/asistente_bellachik/stream', methods=['POST'])
+def asistente_bellachik_stream():
+    """
+    Variante SSE de /asistente_bellachik.
+
+    Reenvía al cliente los fragmentos de texto del asistente conforme llegan
+    (evento 'delta') y al terminar envía los mensajes del hilo (evento 'done').
+    """
+    data = request.get_json()
+    if data is None or 'message' not in data or 'customer' not in data:
+        return jsonify({'status': 'error', 'message': 'Se requieren los campos "message" y "customer" en el JSON.'}), 400
+
+    user_message = data['message']
+    customer = data['customer']
+    eventos = queue.Queue()
+
+    def ejecutar():
+        try:
+            responses = encolar_mensaje(
+                user_message,
+                customer,
+                on_text_delta=lambda texto: eventos.put(("delta", {"content": texto})),
+                full_history=bool(data.get('full_history')),
+            )
+            eventos.put(("done", {"status": "success", "messages": responses}))
+        except Exception as e:
+            logger.exception("Error inesperado en /asistente_bellachik/stream")
+            eventos.put(("error", {"status": "error", "message": f"Error inesperado: {str(e)}"}))
+
+    threading.Thread(target=ejecutar, daemon=True).start()
+
+    def generar():
+        while True:
+            evento, payload = eventos.get()
+            yield f"event: {evento}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            if evento in ("done", "error"):
+                break
+
+    return Response(generar(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def encolar_mensaje(user_message, customer, on_text_delta=None, full_history=False):
+    """
+    Procesa el mensaje serializándolo con los demás mensajes del mismo cliente.
+
+    Si el cliente ya tiene un run en curso (por la API o por WhatsApp), el mensaje se
+    agrupa con los que lleguen mientras tanto y se atienden todos en el siguiente run.
+
+    Args:
+        user_message (str): Mensaje enviado por el usuario.
+        customer (dict): Información del cliente (incluye 'hilo_conversacion').
+        on_text_delta (callable, optional): Función que recibe cada fragmento de texto del asistente.
+        full_history (bool): Si es True se devuelven todos los mensajes del hilo.
+
+    Returns:
+        list: Mensajes con 'role', 'content' y 'thread_id', del más reciente al más antiguo.
+    """
+    key = llave_cliente(customer)
+    if not key:
+        # Sin teléfono no hay una llave común con el webhook: se procesa directamente
+        return procesar_mensaje(user_message, customer, on_text_delta=on_text_delta, full_history=full_history)
+
+    future = programador_mensajes.submit(key, {
+        "message": user_message,
+        "customer": customer,
+        "on_text_delta": on_text_delta,
+        "full_history": full_history,
+    })
+    return future.result()
+
+
+def llave_cliente(customer):
+    """
+    Llave con la que se serializan los mensajes de un cliente: los dígitos de su teléfono,
+    la misma llave que usa el webhook para el número de WhatsApp.
+
+    Args:
+        customer (dict): Información del cliente.
+
+    Returns:
+        str | None: Llave de serialización o None si el request no trae teléfono.
+    """
+    return normalizar_telefono(customer.get('telefono_movil')) or None
+
+
+def resolver_hilo(customer):
+    """
+    Obtiene el hilo del cliente: el enviado en 'hilo_conversacion' o el registrado
+    para su teléfono / id_cliente en el índice local.
+
+    Args:
+        customer (dict): Información del cliente.
+
+    Returns:
+        str | None: ID del hilo o None si el cliente aún no tiene uno.
+    """
+    phone_number = customer.get('telefono_movil')
+    client_id = customer.get('id_cliente')
+    thread_id = customer.get('hilo_conversacion')
+
+    if thread_id:
+        thread_index.link(thread_id, phone_number=phone_number, client_id=client_id)
+        return thread_id
+    return thread_index.get_thread(phone_number=phone_number, client_id=client_id)
+
+
+def procesar_lote_api(key, items):
+    """
+    Ejecuta un solo run para los mensajes agrupados de un cliente.
+
+    Args:
+        key (str): Llave de serialización del cliente.
+        items (list): Mensajes agrupados, en orden de llegada.
+
+    Returns:
+        list: Mensajes con 'role', 'content' y 'thread_id', del más reciente al más antiguo.
+    """
+    callbacks = [item['on_text_delta'] for item in items if item['on_text_delta']]
+
+    def on_text_delta(texto):
+        for callback in callbacks:
+            callback(texto)
+
+    return procesar_mensaje(
+        "\n".join(item['message'] for item in items),
+        items[-1]['customer'],
+        on_text_delta=on_text_delta if callbacks else None,
+        full_history=any(item['full_history'] for item in items),
+    )
+
+
+@medir("turn", operation="procesar_mensaje")
+def procesar_mensaje(user_message, customer, on_text_delta=None, full_history=False, on_message_added=None):
+    """
+    Agrega el mensaje del usuario al hilo, ejecuta el asistente y resuelve sus herramientas.
+
+    Args:
+        user_message (str): Mensaje enviado por el usuario. Si está vacío (su texto ya se
+            agregó en un intento anterior) solo se ejecuta el asistente.
+        customer (dict): Información del cliente (incluye 'hilo_conversacion').
+        on_text_delta (callable, optional): Función que recibe cada fragmento de texto del asistente.
+        full_history (bool): Si es True se devuelven todos los mensajes del hilo y no solo los nuevos.
+        on_message_added (callable, optional): Función que recibe el ID del mensaje del
+            usuario en cuanto se agrega al hilo.
+
+    Returns:
+        list: Mensajes con 'role', 'content' y 'thread_id', del más reciente al más antiguo.
+    """
+    thread_id = resolver_hilo(customer)
+    logger.info("Mensaje del usuario", extra={"ctx": {"thread_id": thread_id, "message": user_message}})
+    
+    #En caso de no tener thread_id, se crea un nuevo hilo
+    if not thread_id:
+        with medir("openai", operation="thread_create"):
+            thread = openai.beta.threads.create()
+        thread_id = thread_index.link(
+            thread.id,
+            phone_number=customer.get('telefono_movil'),
+            client_id=customer.get('id_cliente'),
+        )
+        logger.info("Nuevo thread_id creado", extra={"ctx": {"thread_id": thread_id}})
+    
+    # Agregar el mensaje del usuario al hilo
+    mensaje_usuario = None
+    if user_message:
+        with medir("openai", operation="message_create"):
+            mensaje_usuario = openai.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=user_message,
+            )
+        if on_message_added:
+            on_message_added(mensaje_usuario.id)
+
+    # Ejecutar el asistente hasta un estado terminal, atendiendo todas las rondas de herramientas
+    assistant_id = os.getenv("ASSISTANT_ID")
+    run_manager = AssistantRunManager(assistant_id)
+    with medir("openai", operation="run"):
+        resultado = run_manager.drive(
+            thread_id,
+            tool_handler=lambda tool_calls: tool_executor.execute(tool_calls, construir_function_map(customer)),
+            budget=ASSISTANT_LATENCY_BUDGET,
+            on_text_delta=on_text_delta,
+        )
+
+    # Si se agotó el presupuesto de latencia se responde con un mensaje de respaldo
+    if resultado["timed_out"]:
+        if on_text_delta:
+            on_text_delta(FALLBACK_REPLY)
+        return [{"role": "assistant", "content": FALLBACK_REPLY, "thread_id": thread_id}]
+
+    # Obtener solo los mensajes nuevos del hilo (o todo el historial si se solicita)
+    with medir("openai", operation="message_list"):
+        messages = obtener_mensajes(thread_id, resultado["run"].id, mensaje_usuario, full_history)
+
+    responses = [
+        {"role": msg.role, "content": msg.content[0].text.value, "thread_id": thread_id}
+        for msg in messages
+        #Regresar el thread_id
+    ]
+
+    # Al terminar el turno se envían las actualizaciones diferidas del cliente
+    if escritura_diferida is not None:
+        escritura_diferida.kick()
+    #print(responses)
+
+    return responses
+
+
+def obtener_mensajes(thread_id, run_id, mensaje_usuario, full_history=False):
+    """
+    Recupera los mensajes del turno actual usando el cursor del hilo.
+
+    Con cursor se piden solo los mensajes posteriores al último visto; sin él, los
+    producidos por el run recién ejecutado junto con el mensaje del usuario.
+
+    Args:
+        thread_id (str): ID del hilo de conversación.
+        run_id (str): ID del run recién ejecutado.
+        mensaje_usuario (Message): Mensaje del usuario agregado en este turno, o None.
+        full_history (bool): Si es True se recupera el hilo completo.
+
+    Returns:
+        list: Mensajes del más reciente al más antiguo.
+    """
+    cursor = thread_index.get_cursor(thread_id)
+
+    if full_history:
+        messages = list(openai.beta.threads.messages.list(thread_id=thread_id, order="asc"))
+    elif cursor:
+        messages = list(openai.beta.threads.messages.list(
+            thread_id=thread_id,
+            after=cursor["last_message_id"],
+            order="asc",
+        ))
+    else:
+        messages = ([mensaje_usuario] if mensaje_usuario else []) + list(openai.beta.threads.messages.list(
+            thread_id=thread_id,
+            run_id=run_id,
+            order="asc",
+        ))
+
+    if messages:
+        thread_index.set_cursor(thread_id, messages[-1].id, run_id)
+
+    messages.reverse()
+    return messages
+
+
+def construir_function_map(customer):
+    """
+    Construye el mapeo de herramientas del asistente para el cliente de la conversación.
+
+    Args:
+        customer (dict): Información del cliente enviada en el request.
+
+    Returns:
+        dict: Mapeo de nombre de herramienta a función.
+    """
+    # Gestores compartidos de Google Calendar y Airtable
+    calendar_manager = servicios.get("calendar")
+    airtable_manager = servicios.get("airtable")
+    # Diccionario de mapeo de funciones
+    function_map = {
+        #Funciones para GoogleCalendar
+        "buscar_horarios_disponibles": lambda duracion_minutos=60, cantidad=3, desde=None, hasta=None: calendar_manager.availability.next_free_slots(
+            duracion_minutos, cantidad, desde, hasta),
+
+        # Funciones para AirTable
+        "consultar_cliente": lambda intencion_cliente: format_customer_information(customer),
+        #"actualizar_cliente": lambda id_cliente, campos_actualizar: airtable_manager.actualizar_cliente(id_cliente=id_cliente,campos_actualizar=campos_actualizar),
+        "actualizar_cliente": lambda customer: airtable_manager.actualizar_cliente(
+            id_cliente=customer.get("id_cliente"),
+            campos_actualizar={
+                key: value for key, value in customer.items()
+                if key not in ["id_cliente", "hilo_conversacion"] and value
+            }
+        )
+    }
+    return function_map
+
+
 def format_customer_information(customer):
     """
     Formatea la información del cliente en una cadena legible.
@@ -227,11 +624,9 @@ def format_customer_information(customer):
         dict: Diccionario con el mensaje formateado.
     """
     try:
-        print("Llamando a la funcion")
-        print(customer)
+        logger.debug("Formateando información del cliente", extra={"ctx": {"customer": customer}})
         # Verificar si hay información suficiente
         if not customer or all(not customer.get(key) for key in ['nombre_completo', 'telefono_movil', 'correo_electronico']):
-            print("dentro del if")
             return {
                 "status": "error",
                 "message": "No se encontraron datos suficientes del cliente para mostrar."
@@ -256,8 +651,6 @@ def format_customer_information(customer):
 
         # Generar el mensaje formateado
         mensaje = "Estos son tus datos registrados:\n" + "\n".join(datos_cliente)
-        
-        print(mensaje);
 
         return {
             "status": "success",
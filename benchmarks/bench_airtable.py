@@ -0,0 +1,192 @@
+"""
+Benchmarks de AirtablePATManager contra el servidor local de benchmarks/fake_airtable.py.
+
+Para cada escenario reporta operaciones y solicitudes HTTP por segundo, latencia p50/p99
+por operación, solicitudes HTTP enviadas y respuestas 429 recibidas. Los percentiles solo se
+reportan con al menos MIN_MUESTRAS_PERCENTIL mediciones; los escenarios de lote y el
+recorrido completo miden una llamada por repetición (`--repeat`), así que con pocas
+repeticiones solo se reporta el tiempo total. No toca la base real.
+
+Uso:
+
+    python -m benchmarks.bench_airtable
+    python -m benchmarks.bench_airtable --rps 50 --records 5000 --ops 200
+    python -m benchmarks.bench_airtable --only lookup_cached,bulk_update
+    python -m benchmarks.bench_airtable --only bulk_update --repeat 20
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_airtable import FakeAirtable, clientes_de_prueba, iniciar_servidor  # noqa: E402
+from services.AirTable import AirtablePATManager  # noqa: E402
+from services.RateLimiter import RateLimiter  # noqa: E402
+
+BASE_ID = "appBenchmark"
+
+# Mediciones mínimas para que p50/p99 signifiquen algo
+MIN_MUESTRAS_PERCENTIL = 20
+
+
+def percentil(valores, p):
+    """
+    Percentil por rango más cercano.
+
+    Args:
+        valores (list): Muestras.
+        p (float): Percentil entre 0 y 100.
+
+    Returns:
+        float: Valor del percentil, o 0 si no hay muestras.
+    """
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, min(len(ordenados) - 1, int(round(p / 100 * len(ordenados))) - 1))
+    return ordenados[indice]
+
+
+def medir_operaciones(fn, argumentos):
+    """
+    Ejecuta `fn` una vez por argumento y mide cada llamada.
+
+    Returns:
+        tuple: (latencias en segundos, tiempo total en segundos).
+    """
+    latencias = []
+    inicio = time.perf_counter()
+    for argumento in argumentos:
+        t0 = time.perf_counter()
+        fn(argumento)
+        latencias.append(time.perf_counter() - t0)
+    return latencias, time.perf_counter() - inicio
+
+
+def escenarios(manager, fake, ids, ops, repeat=1):
+    ctx = {"thread_id": "benchmark"}
+    telefonos = [f"55{i:08d}" for i in range(min(ops, len(ids)))]
+
+    def lookup(_):
+        manager.cache_clientes.clear()
+        return medir_operaciones(lambda tel: manager.consultar_cliente(tel, ctx), telefonos)
+
+    def lookup_cached(_):
+        manager.cache_clientes.clear()
+        # La misma conversación consulta varias veces al mismo cliente
+        repetidos = [telefonos[i // 5] for i in range(len(telefonos))]
+        return medir_operaciones(lambda tel: manager.consultar_cliente(tel, ctx), repetidos)
+
+    def update(_):
+        return medir_operaciones(
+            lambda rid: manager.actualizar_cliente(rid, {"Domicilio": "Actualizado"}),
+            ids[:ops],
+        )
+
+    def scan(_):
+        return medir_operaciones(lambda _: sum(1 for _ in manager.iter_records("Clientes")), [None] * repeat)
+
+    def bulk_create(_):
+        lotes = [clientes_de_prueba(ops * 5) for _ in range(repeat)]
+        return medir_operaciones(lambda lote: manager.create_records("Clientes", lote), lotes)
+
+    def bulk_update(_):
+        cambios = [{"id": rid, "fields": {"Sexo": "X"}} for rid in ids[:ops * 5]]
+        return medir_operaciones(lambda lote: manager.update_records("Clientes", lote), [cambios] * repeat)
+
+    def bulk_upsert(_):
+        cambios = [
+            {"fields": {"Teléfono Móvil": f"55{i:08d}", "Domicilio": "Upsert"}}
+            for i in range(ops * 5)
+        ]
+        return medir_operaciones(
+            lambda lote: manager.update_records("Clientes", lote, merge_on=["Teléfono Móvil"]),
+            [cambios] * repeat,
+        )
+
+    def bulk_delete(_):
+        lotes = []
+        for _ in range(repeat):
+            creados = manager.create_records("Clientes", clientes_de_prueba(ops * 5))
+            lotes.append([r["id"] for r in creados if "id" in r])
+        fake.reset_stats()
+        return medir_operaciones(lambda lote: manager.delete_records("Clientes", lote), lotes)
+
+    return {
+        "lookup": (lookup, len(telefonos)),
+        "lookup_cached": (lookup_cached, len(telefonos)),
+        "update": (update, min(ops, len(ids))),
+        "scan": (scan, len(ids) * repeat),
+        "bulk_create": (bulk_create, ops * 5 * repeat),
+        "bulk_update": (bulk_update, min(ops * 5, len(ids)) * repeat),
+        "bulk_upsert": (bulk_upsert, ops * 5 * repeat),
+        "bulk_delete": (bulk_delete, ops * 5 * repeat),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de AirtablePATManager contra un Airtable local")
+    parser.add_argument("--records", type=int, default=1000, help="Clientes sembrados en el servidor")
+    parser.add_argument("--ops", type=int, default=20, help="Operaciones por escenario (x5 en los de lote)")
+    parser.add_argument("--rps", type=int, default=5, help="Límite por base del servidor y del limitador")
+    parser.add_argument("--penalty", type=float, default=30.0, help="Bloqueo del servidor tras exceder el límite")
+    parser.add_argument("--latency", type=float, default=0.02, help="Retardo artificial por solicitud")
+    parser.add_argument("--margin", type=float, default=0.9, help="Fracción del límite que usa el limitador")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones de los escenarios de lote y del recorrido")
+    parser.add_argument("--only", help="Escenarios a ejecutar, separados por comas")
+    parser.add_argument("--json", action="store_true", help="Imprimir resultados en JSON")
+    args = parser.parse_args(argv)
+
+    fake = FakeAirtable(rps=args.rps, penalty=args.penalty, latency=args.latency)
+    ids = fake.seed("Clientes", clientes_de_prueba(args.records))
+    server, api_url = iniciar_servidor(fake)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Igual que en producción, el limitador deja un margen bajo el límite del servidor
+        limiter = RateLimiter(os.path.join(tmp, "rate_limit.db"), rate=args.rps * args.margin)
+        manager = AirtablePATManager(BASE_ID, "token", rate_limiter=limiter, api_url=api_url)
+
+        seleccion = args.only.split(",") if args.only else None
+        resultados = []
+        for nombre, (escenario, operaciones) in escenarios(manager, fake, ids, args.ops, args.repeat).items():
+            if seleccion and nombre not in seleccion:
+                continue
+            fake.reset_stats()
+            latencias, total = escenario(None)
+            solicitudes = sum(v for k, v in fake.stats.items() if k != "429")
+            con_percentiles = len(latencias) >= MIN_MUESTRAS_PERCENTIL
+            resultados.append({
+                "scenario": nombre,
+                "operations": operaciones,
+                "seconds": round(total, 3),
+                "ops_per_sec": round(operaciones / total, 1) if total else 0.0,
+                "requests_per_sec": round(solicitudes / total, 1) if total else 0.0,
+                "p50_ms": round(percentil(latencias, 50) * 1000, 2) if con_percentiles else None,
+                "p99_ms": round(percentil(latencias, 99) * 1000, 2) if con_percentiles else None,
+                "requests": solicitudes,
+                "requests_per_op": round(solicitudes / operaciones, 2) if operaciones else 0.0,
+                "http_429": fake.stats["429"],
+            })
+
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(resultados, indent=2))
+        return resultados
+
+    columnas = ["scenario", "operations", "seconds", "ops_per_sec", "requests_per_sec", "p50_ms", "p99_ms",
+                "requests", "requests_per_op", "http_429"]
+    celda = lambda valor: "-" if valor is None else str(valor)
+    anchos = {c: max(len(c), *(len(celda(r[c])) for r in resultados)) for c in columnas} if resultados else {}
+    print("  ".join(c.ljust(anchos[c]) for c in columnas))
+    for r in resultados:
+        print("  ".join(celda(r[c]).ljust(anchos[c]) for c in columnas))
+    return resultados
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""
+Servidor local que imita la API REST de Airtable para medir AirtablePATManager sin
+tocar la base real.
+
+Implementa lo que usa el gestor: paginación con `offset`/`pageSize`/`maxRecords`,
+proyección `fields[]`, un subconjunto de `filterByFormula` (igualdad, AND/OR/NOT,
+LOWER/UPPER/TRIM, REGEX_REPLACE, FIND, IS_AFTER, LAST_MODIFIED_TIME y DATETIME_PARSE), operaciones
+en lote de hasta 10 registros (con `performUpsert`) y el límite de solicitudes por
+base: al pasar de `rps` solicitudes en un segundo responde 429 durante `penalty` segundos.
+
+Uso independiente:
+
+    python -m benchmarks.fake_airtable --port 8765 --records 2000
+"""
+import argparse
+import json
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+MAX_PAGE_SIZE = 100
+MAX_BATCH_SIZE = 10
+
+_TOKEN = re.compile(r'\s*(?:(?P<string>"(?:[^"\\]|\\.)*")|(?P<field>\{[^}]*\})|(?P<number>-?\d+(?:\.\d+)?)'
+                    r'|(?P<name>[A-Z_][A-Z0-9_]*)|(?P<op>!=|=|\(|\)|,))')
+
+
+class FormulaError(ValueError):
+    pass
+
+
+def _tokens(formula):
+    pos, tokens = 0, []
+    formula = formula.strip()
+    while pos < len(formula):
+        match = _TOKEN.match(formula, pos)
+        if not match:
+            raise FormulaError(f"Fórmula no soportada cerca de: {formula[pos:pos + 20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = re.sub(r"\\(.)", lambda m: {"n": "\n", "r": "\r"}.get(m.group(1), m.group(1)), value[1:-1])
+        elif kind == "field":
+            value = value[1:-1]
+        elif kind == "number":
+            value = float(value)
+        tokens.append((kind, value))
+        pos = match.end()
+        while pos < len(formula) and formula[pos].isspace():
+            pos += 1
+    return tokens
+
+
+def compilar_formula(formula):
+    """
+    Convierte una fórmula `filterByFormula` (subconjunto) en una función sobre registros.
+
+    Args:
+        formula (str): Fórmula de Airtable.
+
+    Returns:
+        callable: Función `f(record)` que devuelve True si el registro cumple la fórmula.
+    """
+    tokens = _tokens(formula)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else (None, None)
+
+    def take(expected=None):
+        nonlocal pos
+        token = peek()
+        if expected and token[1] != expected:
+            raise FormulaError(f"Se esperaba {expected!r} y llegó {token[1]!r}")
+        pos += 1
+        return token
+
+    def expr():
+        left = term()
+        if peek()[1] in ("=", "!="):
+            op = take()[1]
+            right = term()
+            if op == "=":
+                return lambda r: left(r) == right(r)
+            return lambda r: left(r) != right(r)
+        return left
+
+    def term():
+        kind, value = take()
+        if kind in ("string", "number"):
+            return lambda r: value
+        if kind == "field":
+            return lambda r: _valor_campo(r, value)
+        if kind == "name":
+            take("(")
+            args = []
+            while peek()[1] != ")":
+                args.append(expr())
+                if peek()[1] == ",":
+                    take(",")
+            take(")")
+            return _funcion(value, args)
+        raise FormulaError(f"Token inesperado: {value!r}")
+
+    compiled = expr()
+    if pos != len(tokens):
+        raise FormulaError("Sobran tokens en la fórmula")
+    return lambda record: bool(compiled(record))
+
+
+def _valor_campo(record, field):
+    value = record["fields"].get(field)
+    return "" if value is None else value
+
+
+def _funcion(name, args):
+    funciones = {
+        "AND": lambda r: all(a(r) for a in args),
+        "OR": lambda r: any(a(r) for a in args),
+        "NOT": lambda r: not args[0](r),
+        "LOWER": lambda r: str(args[0](r)).lower(),
+        "UPPER": lambda r: str(args[0](r)).upper(),
+        "TRIM": lambda r: str(args[0](r)).strip(),
+        "REGEX_REPLACE": lambda r: re.sub(str(args[1](r)), str(args[2](r)), str(args[0](r))),
+        "FIND": lambda r: str(args[1](r)).find(str(args[0](r))) + 1,
+        "LAST_MODIFIED_TIME": lambda r: r["_modified"],
+        "DATETIME_PARSE": lambda r: _parse_fecha(args[0](r)),
+        "IS_AFTER": lambda r: args[0](r) > args[1](r),
+        "IS_BEFORE": lambda r: args[0](r) < args[1](r),
+    }
+    if name not in funciones:
+        raise FormulaError(f"Función no soportada: {name}")
+    return funciones[name]
+
+
+def _parse_fecha(value):
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+class FakeAirtable:
+    def __init__(self, rps=5, penalty=30.0, latency=0.0):
+        """
+        Estado del servidor: tablas en memoria, límite de solicitudes y contadores.
+
+        Args:
+            rps (int): Solicitudes por segundo permitidas por base.
+            penalty (float): Segundos de bloqueo tras exceder el límite.
+            latency (float): Retardo artificial (segundos) por solicitud.
+        """
+        self.rps = rps
+        self.penalty = penalty
+        self.latency = latency
+        self.tables = {}
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._blocked_until = {}
+
+    def seed(self, table_name, fields_list):
+        """
+        Carga registros en una tabla.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            fields_list (list): Diccionarios de campos.
+
+        Returns:
+            list: IDs de los registros creados.
+        """
+        with self._lock:
+            return [self._insert(table_name, fields)["id"] for fields in fields_list]
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats.clear()
+
+    def _insert(self, table_name, fields):
+        record = {
+            "id": "rec" + uuid.uuid4().hex[:14],
+            "createdTime": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "fields": dict(fields),
+            "_modified": time.time(),
+        }
+        self.tables.setdefault(table_name, {})[record["id"]] = record
+        return record
+
+    def throttle(self, base_id):
+        """Devuelve True si la solicitud excede el límite de la base."""
+        now = time.monotonic()
+        with self._lock:
+            if self._blocked_until.get(base_id, 0) > now:
+                return True
+            window = self._windows.setdefault(base_id, deque())
+            while window and window[0] <= now - 1.0:
+                window.popleft()
+            if len(window) >= self.rps:
+                self._blocked_until[base_id] = now + self.penalty
+                return True
+            window.append(now)
+            return False
+
+    def _public(self, record, fields=None):
+        data = record["fields"]
+        if fields:
+            data = {key: value for key, value in data.items() if key in fields}
+        return {"id": record["id"], "createdTime": record["createdTime"], "fields": data}
+
+    def list(self, table_name, query):
+        page_size = int(query.get("pageSize", [MAX_PAGE_SIZE])[0])
+        if page_size > MAX_PAGE_SIZE:
+            return 422, {"error": {"type": "INVALID_REQUEST_UNKNOWN", "message": "pageSize"}}
+        max_records = int(query.get("maxRecords", [0])[0]) or None
+        fields = query.get("fields[]")
+        offset = int(query.get("offset", [0])[0])
+        formula = query.get("filterByFormula", [None])[0]
+        try:
+            match = compilar_formula(formula) if formula else (lambda r: True)
+        except FormulaError as e:
+            return 422, {"error": {"type": "INVALID_FILTER_BY_FORMULA", "message": str(e)}}
+
+        with self._lock:
+            records = [r for r in self.tables.get(table_name, {}).values() if match(r)]
+        if max_records:
+            records = records[:max_records]
+        page = records[offset:offset + page_size]
+        body = {"records": [self._public(r, fields) for r in page]}
+        if offset + page_size < len(records):
+            body["offset"] = str(offset + page_size)
+        return 200, body
+
+    def create(self, table_name, body):
+        if "records" not in body:
+            with self._lock:
+                return 200, self._public(self._insert(table_name, body.get("fields", {})))
+        if len(body["records"]) > MAX_BATCH_SIZE:
+            return 422, {"error": {"type": "INVALID_RECORDS", "message": "Máximo 10 registros"}}
+        with self._lock:
+            created = [self._insert(table_name, r.get("fields", {})) for r in body["records"]]
+        return 200, {"records": [self._public(r) for r in created]}
+
+    def update(self, table_name, body, record_id=None):
+        with self._lock:
+            table = self.tables.setdefault(table_name, {})
+            if record_id:
+                if record_id not in table:
+                    return 404, {"error": "NOT_FOUND"}
+                record = table[record_id]
+                record["fields"].update(body.get("fields", {}))
+                record["_modified"] = time.time()
+                return 200, self._public(record)
+
+            records = body.get("records", [])
+            if len(records) > MAX_BATCH_SIZE:
+                return 422, {"error": {"type": "INVALID_RECORDS", "message": "Máximo 10 registros"}}
+            merge_on = (body.get("performUpsert") or {}).get("fieldsToMergeOn")
+            result = []
+            for item in records:
+                record = table.get(item.get("id"))
+                if record is None and merge_on:
+                    record = next(
+                        (r for r in table.values()
+                         if all(r["fields"].get(f) == item["fields"].get(f) for f in merge_on)),
+                        None,
+                    )
+                if record is None:
+                    if not merge_on:
+                        return 404, {"error": "NOT_FOUND"}
+                    record = self._insert(table_name, {})
+                record["fields"].update(item.get("fields", {}))
+                record["_modified"] = time.time()
+                result.append(self._public(record))
+            return 200, {"records": result}
+
+    def delete(self, table_name, record_ids):
+        if len(record_ids) > MAX_BATCH_SIZE:
+            return 422, {"error": {"type": "INVALID_RECORDS", "message": "Máximo 10 registros"}}
+        with self._lock:
+            table = self.tables.get(table_name, {})
+            deleted = [{"id": rid, "deleted": table.pop(rid, None) is not None} for rid in record_ids]
+        return 200, {"records": deleted}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Sin esto la respuesta sale en dos escrituras y Nagle + ACK retrasado suman ~40 ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self, method):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.split("/") if p]
+        query = parse_qs(url.query)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        if len(parts) < 3 or parts[0] != "v0":
+            return self._send(404, {"error": "NOT_FOUND"})
+        base_id, table_name = parts[1], parts[2]
+        record_id = parts[3] if len(parts) > 3 else None
+
+        with fake._lock:
+            fake.stats[f"{method} {'record' if record_id else 'table'}"] += 1
+        if fake.throttle(base_id):
+            with fake._lock:
+                fake.stats["429"] += 1
+            return self._send(429, {"errors": [{"error": "RATE_LIMIT_REACHED"}]})
+
+        if method == "GET":
+            status, data = fake.list(table_name, query)
+        elif method == "POST":
+            status, data = fake.create(table_name, body)
+        elif method == "PATCH":
+            status, data = fake.update(table_name, body, record_id)
+        elif method == "DELETE":
+            status, data = fake.delete(table_name, [record_id] if record_id else query.get("records[]", []))
+            if record_id and status == 200:
+                data = data["records"][0]
+        else:
+            status, data = 405, {"error": "METHOD_NOT_ALLOWED"}
+        self._send(status, data)
+
+    def _send(self, status, data):
+        payload = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+
+def iniciar_servidor(fake, host="127.0.0.1", port=0):
+    """
+    Inicia el servidor en un hilo de fondo.
+
+    Args:
+        fake (FakeAirtable): Estado del servidor.
+        host (str): Dirección de escucha.
+        port (int): Puerto (0 elige uno libre).
+
+    Returns:
+        tuple: (servidor, URL base de la API, por ejemplo 'http://127.0.0.1:8765/v0').
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, name="fake-airtable", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v0"
+
+
+def clientes_de_prueba(n):
+    """
+    Genera registros sintéticos para la tabla 'Clientes'.
+
+    Args:
+        n (int): Número de registros.
+
+    Returns:
+        list: Diccionarios de campos.
+    """
+    return [
+        {
+            "Nombre Completo": f"Cliente {i:05d}",
+            "Teléfono Móvil": f"55{i:08d}",
+            "Correo electrónico": f"cliente{i}@example.com",
+            "Domicilio": f"Calle {i}",
+            "Sexo": "F" if i % 2 else "M",
+        }
+        for i in range(n)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local que imita la API de Airtable")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--rps", type=int, default=5)
+    parser.add_argument("--penalty", type=float, default=30.0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeAirtable(rps=args.rps, penalty=args.penalty, latency=args.latency)
+    fake.seed("Clientes", clientes_de_prueba(args.records))
+    server, api_url = iniciar_servidor(fake, port=args.port)
+    print(f"Fake Airtable en {api_url} ({args.records} clientes)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
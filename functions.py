@@ -5,12 +5,13 @@ import pickle
 import requests
 from pprint import pprint
 from flask import Flask, request, jsonify
-from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
 from datetime import datetime, timedelta, timezone
 from google.oauth2.service_account import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+from services.GoogleServiceFactory import get_service
+
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
@@ -49,7 +50,7 @@ def authenticate_google():
 
 def create_google_calendar_event(creds, event_title, start_time, end_time):
 
-    service = build('calendar', 'v3', credentials=creds)
+    service = get_service('calendar', 'v3', creds)
 
     event = {
         'summary': event_title,
@@ -73,7 +74,7 @@ def create_google_calendar_event(creds, event_title, start_time, end_time):
 
 def get_google_calendar_events(creds, time_min, time_max):
 
-    service = build('calendar', 'v3', credentials=creds)
+    service = get_service('calendar', 'v3', creds)
 
     events_result = service.events().list(
         calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',  
@@ -91,10 +92,9 @@ def get_google_calendar_events(creds, time_min, time_max):
 
 from datetime import datetime, timedelta
 import sys
-from googleapiclient.discovery import build
 
 def update_google_calendar_event_by_details(creds, event_title, start_time, updated_title=None, updated_start=None, updated_end=None):
-    service = build('calendar', 'v3', credentials=creds)
+    service = get_service('calendar', 'v3', creds)
 
     try:
         start_datetime = datetime.fromisoformat(start_time)
@@ -139,7 +139,7 @@ def update_google_calendar_event_by_details(creds, event_title, start_time, upda
 
 
 def delete_google_calendar_event_by_details(creds, event_title, start_time):
-    service = build('calendar', 'v3', credentials=creds)
+    service = get_service('calendar', 'v3', creds)
 
     try:
         start_datetime = datetime.fromisoformat(start_time)
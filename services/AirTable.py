@@ -1,20 +1,297 @@
+import random
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+
 import requests
 
+from services.ClientCache import ClientCache, normalizar_correo, normalizar_nombre, normalizar_telefono
+from services.ClienteRecord import CAMPOS_CLIENTE
+from services.HttpTransport import get_session
+from services.Metrics import medir
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+AIRTABLE_API_URL = "https://api.airtable.com/v0"
+
+# Tabla de clientes que se mantiene en caché
+TABLA_CLIENTES = "Clientes"
+
+# Tabla donde guardar_usuario_servicio registra usuarios y servicios agendados
+TABLA_USUARIOS = "Usuarios"
+
+# Máximo de registros por página que acepta la API de Airtable
+MAX_PAGE_SIZE = 100
+
+# Máximo de registros por solicitud en las operaciones en lote
+MAX_BATCH_SIZE = 10
+
+
+# Respuestas que se reintentan con espera exponencial
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+# Un 5xx no dice si la escritura se aplicó: solo se reintentan los métodos idempotentes
+# (un POST repetido crearía registros duplicados). El 429 se reintenta siempre.
+METODOS_IDEMPOTENTES = {"GET", "PATCH", "DELETE"}
+
+# Segundos que Airtable bloquea la base tras exceder el límite de solicitudes
+BLOQUEO_429 = 30.0
+
+
+class AirtableRateLimitError(requests.exceptions.RequestException):
+    """No se obtuvo turno en el limitador de solicitudes dentro de la espera máxima."""
+
+
+def _lotes(iterable, size=MAX_BATCH_SIZE):
+    iterator = iter(iterable)
+    while True:
+        lote = list(islice(iterator, size))
+        if not lote:
+            return
+        yield lote
+
+
+def escapar_formula(valor):
+    """
+    Convierte un valor en un literal de texto seguro para `filterByFormula`.
+
+    Args:
+        valor (object): Valor a comparar dentro de la fórmula.
+
+    Returns:
+        str: Literal entre comillas dobles con las barras y comillas escapadas.
+    """
+    texto = str(valor).replace("\\", "\\\\").replace('"', '\\"')
+    texto = texto.replace("\n", "\\n").replace("\r", "\\r")
+    return f'"{texto}"'
+
+
+def formula_igual(campo, valor, ignorar_mayusculas=False):
+    """
+    Construye la comparación `{campo} = "valor"` para `filterByFormula`.
+
+    Args:
+        campo (str): Nombre del campo en Airtable.
+        valor (object): Valor buscado.
+        ignorar_mayusculas (bool): Si es True compara sin distinguir mayúsculas.
+
+    Returns:
+        str: Fórmula de Airtable.
+    """
+    if ignorar_mayusculas:
+        return f"LOWER(TRIM({{{campo}}})) = {escapar_formula(str(valor).strip().lower())}"
+    return f"{{{campo}}} = {escapar_formula(valor)}"
+
+
+def formula_telefono(campo, valor):
+    """
+    Compara un teléfono por sus dígitos, igual que `normalizar_telefono`.
+
+    Args:
+        campo (str): Nombre del campo en Airtable.
+        valor (str): Teléfono en cualquier formato.
+
+    Returns:
+        str: Fórmula de Airtable, o None si el valor no tiene dígitos.
+    """
+    digitos = normalizar_telefono(valor)
+    if not digitos:
+        return None
+    return f'REGEX_REPLACE({{{campo}}}, "[^0-9]", "") = {escapar_formula(digitos)}'
+
+
+def formula_correo(campo, valor):
+    """
+    Compara un correo sin espacios ni mayúsculas, igual que `normalizar_correo`.
+
+    Args:
+        campo (str): Nombre del campo en Airtable.
+        valor (str): Correo electrónico.
+
+    Returns:
+        str: Fórmula de Airtable, o None si el valor está vacío.
+    """
+    correo = normalizar_correo(valor)
+    if not correo:
+        return None
+    return f"LOWER(TRIM({{{campo}}})) = {escapar_formula(correo)}"
+
+
+def formula_nombre(campo, valor, contiene=False):
+    """
+    Compara un nombre en minúsculas y con espacios simples, igual que `normalizar_nombre`.
+
+    Args:
+        campo (str): Nombre del campo en Airtable.
+        valor (str): Nombre buscado.
+        contiene (bool): Si es True basta con que el nombre del registro contenga el valor.
+
+    Returns:
+        str: Fórmula de Airtable, o None si el valor está vacío.
+    """
+    nombre = normalizar_nombre(valor)
+    if not nombre:
+        return None
+    expresion = f'LOWER(TRIM(REGEX_REPLACE({{{campo}}}, "\\\\s+", " ")))'
+    if contiene:
+        return f"FIND({escapar_formula(nombre)}, {expresion})"
+    return f"{expresion} = {escapar_formula(nombre)}"
+
+
+def formula_combinar(operador, condiciones):
+    """
+    Une varias condiciones con AND u OR, omitiendo las vacías.
+
+    Args:
+        operador (str): "AND" u "OR".
+        condiciones (list): Fórmulas a combinar.
+
+    Returns:
+        str: Fórmula combinada, o None si no hay condiciones.
+    """
+    condiciones = [c for c in condiciones if c]
+    if not condiciones:
+        return None
+    if len(condiciones) == 1:
+        return condiciones[0]
+    return f"{operador}({', '.join(condiciones)})"
+
+
 class AirtablePATManager:
-    def __init__(self, base_id, access_token):
+    def __init__(self, base_id, access_token, cache_ttl=300, cache_size=1024,
+                 rate_limiter=None, max_retries=4, backoff_base=0.5, backoff_max=8.0, max_wait=30.0,
+                 mirror=None, write_behind=None, api_url=AIRTABLE_API_URL):
         """
         Inicializa el cliente de Airtable con un token de acceso personal.
 
         Args:
             base_id (str): ID de la base de Airtable.
             access_token (str): Token de acceso personal para autenticar las solicitudes.
+            cache_ttl (float): Segundos que un cliente permanece en caché (0 la desactiva).
+            cache_size (int): Número máximo de clientes en caché.
+            rate_limiter (RateLimiter, optional): Limitador compartido entre workers, por base.
+            max_retries (int): Reintentos ante 429 o errores 5xx.
+            backoff_base (float): Espera inicial (segundos) entre reintentos.
+            backoff_max (float): Espera máxima (segundos) entre reintentos.
+            max_wait (float): Tiempo máximo (segundos) que una solicitud puede pasar esperando
+                turno y reintentando antes de fallar.
+            mirror (AirtableMirror, optional): Espejo local; si se indica, `consultar_cliente` y
+                `leer_registros` se atienden desde él una vez sincronizado.
+            write_behind (WriteBehindQueue, optional): Cola de escritura diferida; si se indica,
+                `actualizar_cliente` confirma de inmediato y el cambio se envía en segundo plano.
+            api_url (str): URL base de la API (se cambia para apuntar a un servidor de pruebas).
         """
         self.base_id = base_id
         self.access_token = access_token
+        self.api_url = api_url.rstrip("/")
         self.headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json",
         }
+        self.cache_clientes = ClientCache(ttl=cache_ttl, max_entries=cache_size)
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_wait = max_wait
+        self.mirror = mirror
+        if mirror is not None:
+            mirror.bind(self)
+        self.write_behind = write_behind
+        if write_behind is not None:
+            write_behind.bind(self)
+
+    def _request(self, method, url, **kwargs):
+        """
+        Envía una solicitud a Airtable respetando el límite de la base y reintentando
+        ante 429 y, en métodos idempotentes, errores 5xx con espera exponencial con
+        jitter (o `Retry-After`).
+
+        Args:
+            method (str): Método HTTP.
+            url (str): URL de la solicitud.
+            **kwargs: Argumentos adicionales para `requests.Session.request`.
+
+        Returns:
+            requests.Response: Última respuesta recibida.
+
+        Raises:
+            AirtableRateLimitError: Si no se obtuvo turno dentro de `max_wait`.
+            requests.exceptions.RequestException: Si falla la conexión.
+        """
+        deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                remaining = max(0.0, deadline - time.monotonic())
+                if not self.rate_limiter.acquire(self.base_id, timeout=remaining):
+                    raise AirtableRateLimitError(f"Sin turno para Airtable tras {self.max_wait}s")
+
+            response = get_session().request(method, url, headers=self.headers, **kwargs)
+            status = response.status_code
+            if status not in ESTADOS_REINTENTABLES or attempt >= self.max_retries:
+                return response
+            if status != 429 and method.upper() not in METODOS_IDEMPOTENTES:
+                return response
+
+            delay = self._retry_delay(response, attempt)
+            if status == 429 and self.rate_limiter is not None:
+                # Todos los workers se detienen mientras dura la penalización
+                self.rate_limiter.penalize(self.base_id, delay)
+            if time.monotonic() + delay > deadline:
+                return response
+
+            logger.warning("Reintentando solicitud a Airtable", extra={"ctx": {"status": response.status_code, "attempt": attempt + 1, "delay": round(delay, 2)}})
+            time.sleep(delay)
+            attempt += 1
+
+    def _retry_delay(self, response, attempt):
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        if response.status_code == 429:
+            # Sin Retry-After se espera el bloqueo documentado completo
+            return BLOQUEO_429
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _cachear(self, table_name, records, fields=None):
+        # Solo se guardan registros con todos los campos del cliente
+        if table_name != TABLA_CLIENTES:
+            return
+        if fields and not set(CAMPOS_CLIENTE.values()) <= set(fields):
+            return
+        for record in records:
+            self.cache_clientes.put(record)
+
+    def _registrar_escritura(self, table_name, records):
+        # Los registros devueltos por Airtable tras escribir reemplazan la copia en caché y espejo
+        self._cachear(table_name, records)
+        if self.mirror is not None:
+            self.mirror.upsert(table_name, records)
+
+    def _descartar(self, table_name, record_ids):
+        if table_name == TABLA_CLIENTES:
+            for record_id in record_ids:
+                self.cache_clientes.invalidate(record_id)
+        if self.mirror is not None:
+            self.mirror.delete(table_name, record_ids)
+
+    def _con_pendientes(self, record_id, fields):
+        # Superpone los cambios de escritura diferida que aún no llegan a Airtable
+        if self.write_behind is None:
+            return fields
+        return {**fields, **self.write_behind.pending(record_id)}
+
+    def _usar_espejo(self, table_name):
+        if self.mirror is None or table_name not in self.mirror.tables:
+            return False
+        self.mirror.start()
+        return self.mirror.ready(table_name)
 
     def _get_table_url(self, table_name):
         """
@@ -26,15 +303,16 @@ class AirtablePATManager:
         Returns:
             str: URL completa de la tabla.
         """
-        return f"https://api.airtable.com/v0/{self.base_id}/{table_name}"
+        return f"{self.api_url}/{self.base_id}/{table_name}"
 
-    def list_records(self, table_name, max_records=10, view=None):
+    def list_records(self, table_name, max_records=10, view=None, fields=None):
         """
         Lista los registros de la tabla.
 
         Args:
             max_records (int): Número máximo de registros a recuperar.
             view (str, optional): Vista específica desde la cual recuperar registros.
+            fields (list, optional): Campos a devolver; si se omite se devuelven todos.
 
         Returns:
             dict: Respuesta de la API de Airtable con los registros.
@@ -42,17 +320,91 @@ class AirtablePATManager:
         params = {"maxRecords": max_records}
         if view:
             params["view"] = view
+        if fields:
+            params["fields[]"] = list(fields)
 
         url = self._get_table_url(table_name)
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            with medir("airtable", operation="list_records"):
+                response = self._request("GET", url, params=params)
             response.raise_for_status()
-            return response.json()
+            data = response.json()
+            self._cachear(table_name, data.get("records", []), fields)
+            return data
         except requests.exceptions.RequestException as e:
-            print(f"Error al listar registros: {e}")
+            logger.error("Error al listar registros", extra={"ctx": {"table": table_name, "error": str(e)}})
             return None
 
 
+    def iter_records(self, table_name, page_size=MAX_PAGE_SIZE, fields=None, view=None,
+                     filter_formula=None, max_records=None):
+        """
+        Recorre los registros de la tabla página por página siguiendo el cursor `offset`.
+
+        Es un generador: cada página se solicita solo cuando se consumieron los registros
+        de la anterior, por lo que el llamador puede detenerse en cuanto encuentra lo que
+        busca y la memoria usada se limita a una página.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            page_size (int): Registros por página (máximo 100).
+            fields (list, optional): Campos a devolver; si se omite se devuelven todos.
+            view (str, optional): Vista específica desde la cual recuperar registros.
+            filter_formula (str, optional): Fórmula `filterByFormula` de Airtable.
+            max_records (int, optional): Número máximo de registros en total.
+
+        Yields:
+            dict: Registro con 'id', 'createdTime' y 'fields'.
+
+        Raises:
+            requests.exceptions.RequestException: Si falla alguna de las solicitudes.
+        """
+        params = {"pageSize": min(page_size, MAX_PAGE_SIZE)}
+        if fields:
+            params["fields[]"] = list(fields)
+        if view:
+            params["view"] = view
+        if filter_formula:
+            params["filterByFormula"] = filter_formula
+        if max_records:
+            params["maxRecords"] = max_records
+
+        url = self._get_table_url(table_name)
+        while True:
+            with medir("airtable", operation="list_records_page"):
+                response = self._request("GET", url, params=params)
+            response.raise_for_status()
+            data = response.json()
+            records = data.get("records", [])
+            self._cachear(table_name, records, fields)
+
+            yield from records
+
+            offset = data.get("offset")
+            if not offset:
+                return
+            params["offset"] = offset
+
+    def buscar_registro(self, table_name, formula, fields=None):
+        """
+        Devuelve el primer registro que cumple una fórmula, pidiendo un solo registro a Airtable.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            formula (str): Fórmula `filterByFormula`.
+            fields (list, optional): Campos a devolver; si se omite se devuelven todos.
+
+        Returns:
+            dict: Registro encontrado, o None si ninguno coincide.
+
+        Raises:
+            requests.exceptions.RequestException: Si falla la solicitud.
+        """
+        records = self.iter_records(
+            table_name, page_size=1, fields=fields, filter_formula=formula, max_records=1
+        )
+        return next(records, None)
+
     def create_record(self, table_name, dataRequest):
         """
         Crea un nuevo registro en la tabla.
@@ -64,15 +416,17 @@ class AirtablePATManager:
             dict: Respuesta de la API de Airtable para el registro creado.
         """
         url = self._get_table_url(table_name)
-        print(f"CREAMOS LA TABLA: {table_name}")
-        print("con los datos")
-        print(dataRequest)
+        logger.debug("Creando registro", extra={"ctx": {"table": table_name, "data": dataRequest}})
         try:
-            response = requests.post(url, headers=self.headers, json=dataRequest)
+            with medir("airtable", operation="create_record"):
+                response = self._request("POST", url, json=dataRequest)
             response.raise_for_status()
-            return response.json()
+            data = response.json()
+            if "id" in data:
+                self._registrar_escritura(table_name, [data])
+            return data
         except requests.exceptions.RequestException as e:
-            print(f"Error al crear un registro: {e}")
+            logger.error("Error al crear un registro", extra={"ctx": {"table": table_name, "error": str(e)}})
             return None
         
     def create_airtable_record(self, table_name, dataRequest):
@@ -95,11 +449,12 @@ class AirtablePATManager:
         url = f"{self.base_url}"
 
         try:
-            response = requests.post(url, headers=self.headers, json=dataRequest)
+            with medir("airtable", operation="create_record"):
+                response = self._request("POST", url, json=dataRequest)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Error al crear un registro en la tabla '{table_name}': {e}")
+            logger.error("Error al crear un registro", extra={"ctx": {"table": table_name, "error": str(e)}})
             return None
 
     def update_record(self, table_name, record_id, fields):
@@ -117,11 +472,16 @@ class AirtablePATManager:
         url = f"{self._get_table_url(table_name)}/{record_id}"
         data = {"fields": fields}
         try:
-            response = requests.patch(url, headers=self.headers, json=data)
+            with medir("airtable", operation="update_record"):
+                response = self._request("PATCH", url, json=data)
             response.raise_for_status()
-            return response.json()
+            record = response.json()
+            self._registrar_escritura(table_name, [record])
+            return record
         except requests.exceptions.RequestException as e:
-            print(f"Error al actualizar el registro: {e}")
+            if table_name == TABLA_CLIENTES:
+                self.cache_clientes.invalidate(record_id)
+            logger.error("Error al actualizar el registro", extra={"ctx": {"table": table_name, "record_id": record_id, "error": str(e)}})
             return None
 
     def delete_record(self, table_name, record_id):
@@ -137,13 +497,155 @@ class AirtablePATManager:
         """
         url = f"{self._get_table_url(table_name)}/{record_id}"
         try:
-            response = requests.delete(url, headers=self.headers)
+            with medir("airtable", operation="delete_record"):
+                response = self._request("DELETE", url)
             response.raise_for_status()
+            self._descartar(table_name, [record_id])
             return response.json()
         except requests.exceptions.RequestException as e:
-            print(f"Error al eliminar el registro: {e}")
+            if table_name == TABLA_CLIENTES:
+                self.cache_clientes.invalidate(record_id)
+            logger.error("Error al eliminar el registro", extra={"ctx": {"table": table_name, "record_id": record_id, "error": str(e)}})
             return None
         
+    def create_records(self, table_name, records, typecast=False, max_workers=3):
+        """
+        Crea muchos registros enviándolos en lotes de 10.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            records (iterable): Diccionarios de campos, o registros con la forma {'fields': {...}}.
+            typecast (bool): Si es True Airtable convierte los valores al tipo de cada campo.
+            max_workers (int): Número máximo de lotes enviándose a la vez.
+
+        Returns:
+            list: Un resultado por registro, en el mismo orden de entrada: el registro creado
+            o {'error', 'fields'} si su lote falló.
+        """
+        def enviar(lote):
+            payload = {
+                "records": [{"fields": r["fields"] if "fields" in r else r} for r in lote],
+                "typecast": typecast,
+            }
+            with medir("airtable", operation="create_records"):
+                response = self._request("POST", self._get_table_url(table_name), json=payload)
+            response.raise_for_status()
+            return response.json().get("records", [])
+
+        def error(record, e):
+            return {"error": str(e), "fields": record.get("fields", record)}
+
+        return self._procesar_lotes(table_name, records, enviar, error, max_workers)
+
+    def update_records(self, table_name, records, merge_on=None, typecast=False, max_workers=3):
+        """
+        Actualiza muchos registros enviándolos en lotes de 10.
+
+        Con `merge_on` se usa `performUpsert`: cada registro se empareja por esos campos
+        en lugar de por ID, y se crea si no existe.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            records (iterable): Registros con la forma {'id', 'fields'} ('id' opcional con `merge_on`).
+            merge_on (list, optional): Campos por los que se emparejan los registros (upsert).
+            typecast (bool): Si es True Airtable convierte los valores al tipo de cada campo.
+            max_workers (int): Número máximo de lotes enviándose a la vez.
+
+        Returns:
+            list: Un resultado por registro, en el mismo orden de entrada: el registro actualizado
+            (o creado) o {'error', 'status', 'id', 'fields'} si su lote falló ('status' es el
+            código HTTP, o None si no hubo respuesta).
+        """
+        def enviar(lote):
+            payload = {
+                "records": [
+                    {key: r[key] for key in ("id", "fields") if key in r} for r in lote
+                ],
+                "typecast": typecast,
+            }
+            if merge_on:
+                payload["performUpsert"] = {"fieldsToMergeOn": list(merge_on)}
+            with medir("airtable", operation="update_records"):
+                response = self._request("PATCH", self._get_table_url(table_name), json=payload)
+            response.raise_for_status()
+            return response.json().get("records", [])
+
+        def error(record, e):
+            if table_name == TABLA_CLIENTES and record.get("id"):
+                self.cache_clientes.invalidate(record["id"])
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            return {"error": str(e), "status": status, "id": record.get("id"), "fields": record.get("fields")}
+
+        return self._procesar_lotes(table_name, records, enviar, error, max_workers)
+
+    def delete_records(self, table_name, record_ids, max_workers=3):
+        """
+        Elimina muchos registros enviándolos en lotes de 10.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            record_ids (iterable): IDs de los registros a eliminar.
+            max_workers (int): Número máximo de lotes enviándose a la vez.
+
+        Returns:
+            list: Un resultado por registro, en el mismo orden de entrada:
+            {'id', 'deleted'} o {'error', 'id'} si su lote falló.
+        """
+        def enviar(lote):
+            params = [("records[]", record_id) for record_id in lote]
+            with medir("airtable", operation="delete_records"):
+                response = self._request("DELETE", self._get_table_url(table_name), params=params)
+            response.raise_for_status()
+            records = response.json().get("records", [])
+            self._descartar(table_name, [r["id"] for r in records if r.get("deleted")])
+            return records
+
+        def error(record_id, e):
+            if table_name == TABLA_CLIENTES:
+                self.cache_clientes.invalidate(record_id)
+            return {"error": str(e), "id": record_id}
+
+        return self._procesar_lotes(table_name, record_ids, enviar, error, max_workers, registrar=False)
+
+    def _procesar_lotes(self, table_name, items, enviar, error, max_workers, registrar=True):
+        # Mantiene como máximo `max_workers` lotes en vuelo para no consumir todo el iterable
+        # de entrada ni saturar el límite de solicitudes de la base. Con un solo worker los
+        # lotes se envían en el hilo actual (sirve también al terminar el intérprete, cuando
+        # ya no se aceptan tareas nuevas en un ThreadPoolExecutor)
+        results = []
+        pending = deque()
+
+        def recoger():
+            lote, future = pending.popleft()
+            try:
+                records = future.result()
+                if registrar:
+                    self._registrar_escritura(table_name, records)
+                results.extend(records)
+            except requests.exceptions.RequestException as e:
+                logger.error("Error en operación en lote", extra={"ctx": {"table": table_name, "records": len(lote), "error": str(e)}})
+                results.extend(error(item, e) for item in lote)
+
+        if max_workers <= 1:
+            for lote in _lotes(items):
+                future = Future()
+                try:
+                    future.set_result(enviar(lote))
+                except requests.exceptions.RequestException as e:
+                    future.set_exception(e)
+                pending.append((lote, future))
+                recoger()
+            return results
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="airtable-batch") as pool:
+            for lote in _lotes(items):
+                pending.append((lote, pool.submit(enviar, lote)))
+                if len(pending) >= max_workers:
+                    recoger()
+            while pending:
+                recoger()
+        return results
+
     def guardar_usuario_servicio(self,nombre, telefono, correo, servicio_agendado):
         """
         Guarda la información del usuario y el servicio agendado en una tabla de Airtable.
@@ -190,13 +692,13 @@ class AirtablePATManager:
                 }
 
         except Exception as e:
-            print(f"Error inesperado: {str(e)}")
+            logger.exception("Error inesperado al guardar el usuario")
             return {
                 "message": "Ocurrió un error al guardar el usuario.",
                 "error": str(e)
             }
 
-    def update_user_info(self, telefono, nombre=None, email=None, servicio_agendado=None):
+    def update_user_info(self, telefono, nombre=None, email=None, servicio_agendado=None, table_name=TABLA_USUARIOS):
         """
         Actualiza un registro en Airtable basado en el teléfono proporcionado.
 
@@ -205,19 +707,16 @@ class AirtablePATManager:
             nombre (str, optional): Nuevo nombre del usuario.
             email (str, optional): Nuevo correo electrónico.
             servicio_agendado (str, optional): Nuevo servicio agendado.
+            table_name (str, optional): Tabla de usuarios.
 
         Returns:
             dict: Resultado de la operación.
         """
         try:
-            # Obtener registros existentes que coincidan con el teléfono
-            records = self.list_records(max_records=100)
-            record_to_update = None
-
-            for record in records.get("records", []):
-                if record["fields"].get("Teléfono") == telefono:
-                    record_to_update = record
-                    break
+            # Buscar en Airtable el registro con el teléfono
+            record_to_update = self.buscar_registro(
+                table_name, formula_telefono("Teléfono", telefono), fields=["Teléfono"]
+            )
 
             if not record_to_update:
                 return {"message": "No se encontró ningún registro con el teléfono proporcionado."}
@@ -236,7 +735,7 @@ class AirtablePATManager:
 
             # Actualizar el registro
             record_id = record_to_update["id"]
-            response = self.update_record(record_id, updated_fields)
+            response = self.update_record(table_name, record_id, updated_fields)
 
             return {
                 "message": "El registro se actualizó exitosamente.",
@@ -246,7 +745,7 @@ class AirtablePATManager:
         except Exception as e:
             return {"message": "Error al actualizar el registro.", "error": str(e)}
     
-    def leer_registros(self, nombre=None, email=None, telefono=None):
+    def leer_registros(self, nombre=None, email=None, telefono=None, table_name=TABLA_USUARIOS):
         """
         Lee registros de Airtable filtrando por nombre, email o teléfono.
 
@@ -254,34 +753,40 @@ class AirtablePATManager:
             nombre (str, optional): Nombre del usuario.
             email (str, optional): Correo electrónico del usuario.
             telefono (str, optional): Teléfono del usuario.
+            table_name (str, optional): Tabla de usuarios.
 
         Returns:
             dict: Lista de registros encontrados.
         """
         try:
-            # Obtener todos los registros
-            records = self.list_records(max_records=100)
-            filtered_records = []
+            if self._usar_espejo(table_name):
+                # Consultar los índices del espejo local
+                records = self.mirror.find(
+                    table_name, phone=telefono, email=email, name=nombre, name_contains=True
+                ) if (nombre or email or telefono) else []
+            else:
+                # Filtrar en Airtable con los criterios proporcionados
+                formula = formula_combinar("AND", [
+                    formula_nombre("Nombre", nombre, contiene=True),
+                    formula_correo("Correo", email),
+                    formula_telefono("Teléfono", telefono),
+                ])
+                records = self.iter_records(
+                    table_name,
+                    fields=["Nombre", "Correo", "Teléfono", "Servicio Agendado"],
+                    filter_formula=formula,
+                )
 
-            for record in records.get("records", []):
+            filtered_records = []
+            for record in records:
                 fields = record.get("fields", {})
-                match = True
-
-                if nombre and nombre.lower() not in fields.get("Nombre", "").lower():
-                    match = False
-                if email and email.lower() != fields.get("Correo", "").lower():
-                    match = False
-                if telefono and telefono != fields.get("Teléfono", ""):
-                    match = False
-
-                if match:
-                    filtered_records.append({
-                        "id": record.get("id"),
-                        "Nombre": fields.get("Nombre"),
-                        "Correo": fields.get("Correo"),
-                        "Teléfono": fields.get("Teléfono"),
-                        "Servicio Agendado": fields.get("Servicio Agendado", "")
-                    })
+                filtered_records.append({
+                    "id": record.get("id"),
+                    "Nombre": fields.get("Nombre"),
+                    "Correo": fields.get("Correo"),
+                    "Teléfono": fields.get("Teléfono"),
+                    "Servicio Agendado": fields.get("Servicio Agendado", "")
+                })
 
             if not filtered_records:
                 return {"message": "No se encontraron registros que coincidan con los criterios de búsqueda."}
@@ -291,13 +796,14 @@ class AirtablePATManager:
         except Exception as e:
             return {"message": "Error al leer los registros.", "error": str(e)}
         
-    def borrar_registro(self, telefono=None, email=None):
+    def borrar_registro(self, telefono=None, email=None, table_name=TABLA_USUARIOS):
         """
         Elimina un registro de Airtable basado en el teléfono o correo electrónico.
 
         Args:
             telefono (str, optional): Teléfono del usuario para identificar el registro.
             email (str, optional): Correo electrónico del usuario para identificar el registro.
+            table_name (str, optional): Tabla de usuarios.
 
         Returns:
             dict: Resultado de la operación.
@@ -306,25 +812,21 @@ class AirtablePATManager:
             if not telefono and not email:
                 return {"message": "Debe proporcionar un teléfono o un correo electrónico para borrar un registro."}
 
-            # Obtener registros existentes
-            records = self.list_records(max_records=100)
-            record_to_delete = None
-
-            for record in records.get("records", []):
-                fields = record.get("fields", {})
-                if telefono and fields.get("Teléfono") == telefono:
-                    record_to_delete = record
-                    break
-                if email and fields.get("Correo") == email:
-                    record_to_delete = record
-                    break
+            # Buscar en Airtable el registro por teléfono o correo
+            formula = formula_combinar("OR", [
+                formula_telefono("Teléfono", telefono),
+                formula_correo("Correo", email),
+            ])
+            record_to_delete = self.buscar_registro(
+                table_name, formula, fields=["Teléfono", "Correo"]
+            )
 
             if not record_to_delete:
                 return {"message": "No se encontró ningún registro con los criterios proporcionados."}
 
             # Eliminar el registro
             record_id = record_to_delete["id"]
-            response = self.delete_record(record_id)
+            response = self.delete_record(table_name, record_id)
 
             return {
                 "message": "El registro se eliminó exitosamente.",
@@ -379,7 +881,7 @@ class AirtablePATManager:
                 }
 
         except Exception as e:
-            print(f"Error inesperado al crear el registro: {str(e)}")
+            logger.exception("Error inesperado al crear el registro")
             return {
                 "message": "Ocurrió un error inesperado al crear el registro.",
                 "error": str(e)
@@ -396,9 +898,7 @@ class AirtablePATManager:
         Returns:
             dict: Información del cliente o mensaje solicitando más datos.
         """
-        print("DESDE LA FUNCION")
-        print(client_identifier)
-        print(context)
+        logger.debug("Consultando cliente", extra={"ctx": {"client_identifier": client_identifier}})
         try:
             # Validar el contexto
             if not context or "thread_id" not in context:
@@ -420,19 +920,31 @@ class AirtablePATManager:
                     "message": "No se pudo identificar al cliente. Por favor, proporciona tu nombre completo o número de teléfono."
                 }
 
-            # Buscar el cliente en la tabla 'Clientes'
-            records = self.list_records("Clientes", max_records=100)
-            client_data = None
-
-            for record in records.get("records", []):
-                fields = record.get("fields", {})
-                if (
-                    fields.get("Teléfono Móvil") == client_identifier
-                    or fields.get("Correo electrónico") == client_identifier
-                    or fields.get("Nombre Completo").lower() == client_identifier.lower()
-                ):
-                    client_data = fields
-                    break
+            # Consultas repetidas dentro de la conversación se resuelven en memoria
+            cached = self.cache_clientes.find(client_identifier)
+            if cached:
+                return {"status": "success", "data": self._con_pendientes(cached.id, cached.fields)}
+
+            if self._usar_espejo(TABLA_CLIENTES):
+                # Buscar al cliente en los índices del espejo local
+                records = self.mirror.find(
+                    TABLA_CLIENTES,
+                    phone=client_identifier,
+                    email=client_identifier,
+                    name=client_identifier,
+                    match_any=True,
+                    limit=1,
+                )
+                record = records[0] if records else None
+            else:
+                # Buscar al cliente en la tabla 'Clientes' por teléfono, correo o nombre
+                formula = formula_combinar("OR", [
+                    formula_telefono("Teléfono Móvil", client_identifier),
+                    formula_correo("Correo electrónico", client_identifier),
+                    formula_nombre("Nombre Completo", client_identifier),
+                ])
+                record = self.buscar_registro(TABLA_CLIENTES, formula, fields=list(CAMPOS_CLIENTE.values()))
+            client_data = self._con_pendientes(record["id"], record.get("fields", {})) if record else None
 
             if not client_data:
                 return {
@@ -495,8 +1007,17 @@ class AirtablePATManager:
             if not campos_actualizar or not isinstance(campos_actualizar, dict):
                 return {"status": "error", "message": "Debe proporcionar campos válidos para actualizar."}
 
+            if self.write_behind is not None:
+                # Se confirma de inmediato; el cambio se envía a Airtable en segundo plano
+                pendientes = self.write_behind.enqueue(id_cliente, campos_actualizar)
+                return {
+                    "status": "success",
+                    "message": "Información del cliente actualizada exitosamente.",
+                    "data": {"id": id_cliente, "fields": pendientes}
+                }
+
             # Usar update_record para actualizar el registro
-            response = self.update_record("Clientes", id_cliente, campos_actualizar)
+            response = self.update_record(TABLA_CLIENTES, id_cliente, campos_actualizar)
 
             if response:
                 return {
@@ -0,0 +1,314 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from services.ClientCache import normalizar_correo, normalizar_nombre, normalizar_telefono
+from services.ClienteRecord import CAMPOS_CLIENTE
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+# Por tabla: columna indexada del espejo -> campo de Airtable, y campos que se copian
+TABLAS_ESPEJO = {
+    "Clientes": {
+        "phone": "Teléfono Móvil",
+        "email": "Correo electrónico",
+        "name": "Nombre Completo",
+        "fields": list(CAMPOS_CLIENTE.values()),
+    },
+    "Usuarios": {
+        "phone": "Teléfono",
+        "email": "Correo",
+        "name": "Nombre",
+        "fields": ["Nombre", "Correo", "Teléfono", "Servicio Agendado"],
+    },
+}
+
+
+class AirtableMirror:
+    def __init__(self, path, tables=None, interval=60.0, full_sync_interval=3600.0, overlap=120.0):
+        """
+        Copia local (SQLite en modo WAL) de tablas de Airtable para consultas de clientes.
+
+        Cada `interval` segundos se traen solo los registros modificados desde la última
+        sincronización (filtro `LAST_MODIFIED_TIME()`); cada `full_sync_interval` se hace una
+        copia completa para eliminar los registros borrados en Airtable. Un solo worker
+        sincroniza cada tabla a la vez; todos leen del mismo archivo.
+
+        Args:
+            path (str): Ruta del archivo SQLite.
+            tables (dict, optional): Campos indexados por tabla. Por defecto TABLAS_ESPEJO.
+            interval (float): Segundos entre sincronizaciones incrementales.
+            full_sync_interval (float): Segundos entre sincronizaciones completas.
+            overlap (float): Segundos que se restan al cursor para tolerar diferencias de reloj.
+        """
+        self.path = path
+        self.tables = tables or TABLAS_ESPEJO
+        self.interval = interval
+        self.full_sync_interval = full_sync_interval
+        self.overlap = overlap
+        self.manager = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS records (
+                table_name TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                phone TEXT,
+                email TEXT,
+                name TEXT,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (table_name, record_id)
+            )
+            """
+        )
+        for column in ("phone", "email", "name"):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_records_{column} ON records (table_name, {column})")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                table_name TEXT PRIMARY KEY,
+                cursor TEXT,
+                last_sync REAL NOT NULL DEFAULT 0,
+                last_full_sync REAL NOT NULL DEFAULT 0,
+                lease_until REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+    def bind(self, manager):
+        """
+        Asocia el gestor de Airtable con el que se sincroniza el espejo.
+
+        Args:
+            manager (AirtablePATManager): Gestor usado para leer las tablas.
+        """
+        self.manager = manager
+
+    def start(self):
+        """Inicia (una vez por worker) el hilo de sincronización periódica."""
+        if self._pid == os.getpid() or self.manager is None:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._sync_loop, name="airtable-mirror", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _sync_loop(self):
+        while True:
+            for table_name in self.tables:
+                try:
+                    self.sync(table_name)
+                except Exception:
+                    logger.exception("Error al sincronizar el espejo de Airtable", extra={"ctx": {"table": table_name}})
+            time.sleep(self.interval)
+
+    def ready(self, table_name):
+        """
+        Indica si la tabla ya se copió completa al menos una vez.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+
+        Returns:
+            bool: True si el espejo puede atender consultas de la tabla.
+        """
+        row = self._connect().execute(
+            "SELECT last_full_sync FROM sync_state WHERE table_name = ?", (table_name,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    def _claim(self, table_name, now):
+        # Toma la sincronización de la tabla si toca y ningún otro worker la tiene
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO sync_state (table_name) VALUES (?)", (table_name,))
+            cursor, last_sync, last_full_sync, lease_until = conn.execute(
+                "SELECT cursor, last_sync, last_full_sync, lease_until FROM sync_state WHERE table_name = ?",
+                (table_name,),
+            ).fetchone()
+            if lease_until > now or now - last_sync < self.interval:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE sync_state SET lease_until = ? WHERE table_name = ?",
+                (now + max(self.interval, 300), table_name),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        full = not cursor or now - last_full_sync >= self.full_sync_interval
+        return {"cursor": None if full else cursor}
+
+    def sync(self, table_name, force_full=False):
+        """
+        Sincroniza una tabla con Airtable si corresponde.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            force_full (bool): Si es True se hace una copia completa aunque no toque.
+
+        Returns:
+            int: Número de registros copiados, o None si no correspondía sincronizar.
+        """
+        now = time.time()
+        claim = self._claim(table_name, now)
+        if claim is None and not force_full:
+            return None
+        full = force_full or claim["cursor"] is None
+
+        formula = None
+        if not full:
+            formula = f'IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE("{claim["cursor"]}"))'
+        cursor = datetime.fromtimestamp(now - self.overlap, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+        count = 0
+        conn = self._connect()
+        try:
+            batch = []
+            records = self.manager.iter_records(
+                table_name, fields=self.tables[table_name].get("fields"), filter_formula=formula
+            )
+            for record in records:
+                batch.append(record)
+                if len(batch) >= 500:
+                    self.upsert(table_name, batch, synced_at=now)
+                    count += len(batch)
+                    batch = []
+            self.upsert(table_name, batch, synced_at=now)
+            count += len(batch)
+
+            if full:
+                # Lo que no llegó en la copia completa se borró en Airtable
+                conn.execute("DELETE FROM records WHERE table_name = ? AND synced_at < ?", (table_name, now))
+            conn.execute(
+                f"""
+                UPDATE sync_state SET cursor = ?, last_sync = ?, lease_until = 0
+                {", last_full_sync = ?" if full else ""}
+                WHERE table_name = ?
+                """,
+                (cursor, now, now, table_name) if full else (cursor, now, table_name),
+            )
+        except Exception:
+            conn.execute("UPDATE sync_state SET lease_until = 0 WHERE table_name = ?", (table_name,))
+            raise
+
+        logger.info("Espejo de Airtable sincronizado", extra={"ctx": {"table": table_name, "full": full, "records": count}})
+        return count
+
+    def upsert(self, table_name, records, synced_at=None):
+        """
+        Guarda o reemplaza registros en el espejo.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            records (list): Registros de Airtable con 'id' y 'fields'.
+            synced_at (float, optional): Marca de tiempo de la copia. Por defecto ahora.
+        """
+        if table_name not in self.tables or not records:
+            return
+        columns = self.tables[table_name]
+        synced_at = synced_at or time.time()
+        rows = []
+        for record in records:
+            fields = record.get("fields", {})
+            rows.append((
+                table_name,
+                record["id"],
+                json.dumps(fields, ensure_ascii=False),
+                normalizar_telefono(fields.get(columns["phone"])) or None,
+                normalizar_correo(fields.get(columns["email"])) or None,
+                normalizar_nombre(fields.get(columns["name"])) or None,
+                synced_at,
+            ))
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO records (table_name, record_id, fields, phone, email, name, synced_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, table_name, record_ids):
+        """
+        Elimina registros del espejo.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            record_ids (list): IDs de los registros.
+        """
+        self._connect().executemany(
+            "DELETE FROM records WHERE table_name = ? AND record_id = ?",
+            [(table_name, record_id) for record_id in record_ids],
+        )
+
+    def find(self, table_name, phone=None, email=None, name=None, name_contains=False, match_any=False, limit=None):
+        """
+        Busca registros por teléfono, correo o nombre usando los índices locales.
+
+        Args:
+            table_name (str): Nombre de la tabla.
+            phone (str, optional): Teléfono (se comparan solo los dígitos).
+            email (str, optional): Correo (sin distinguir mayúsculas).
+            name (str, optional): Nombre (sin distinguir mayúsculas ni espacios repetidos; los acentos cuentan).
+            name_contains (bool): Si es True el nombre se busca como subcadena.
+            match_any (bool): Si es True basta con que coincida un criterio; si no, todos.
+            limit (int, optional): Número máximo de registros.
+
+        Returns:
+            list: Registros con 'id' y 'fields'.
+        """
+        conditions, params = [], []
+        if phone and normalizar_telefono(phone):
+            conditions.append("phone = ?")
+            params.append(normalizar_telefono(phone))
+        if email:
+            conditions.append("email = ?")
+            params.append(normalizar_correo(email))
+        if name:
+            if name_contains:
+                conditions.append("name LIKE ? ESCAPE '\\'")
+                escaped = normalizar_nombre(name).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                params.append(f"%{escaped}%")
+            else:
+                conditions.append("name = ?")
+                params.append(normalizar_nombre(name))
+        if not conditions:
+            return []
+
+        where = (" OR " if match_any else " AND ").join(conditions)
+        sql = f"SELECT record_id, fields FROM records WHERE table_name = ? AND ({where})"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        rows = self._connect().execute(sql, [table_name, *params]).fetchall()
+        return [{"id": record_id, "fields": json.loads(fields)} for record_id, fields in rows]
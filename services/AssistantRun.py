@@ -0,0 +1,272 @@
+import time
+
+import openai
+
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+# Estados en los que el run ya no avanza sin intervención externa
+ESTADOS_FINALES = ("completed", "failed", "cancelled", "expired", "incomplete", "requires_action")
+
+# Estados en los que el run terminó definitivamente
+ESTADOS_TERMINALES = ("completed", "failed", "cancelled", "expired", "incomplete")
+
+
+class AssistantRunManager:
+    def __init__(self, assistant_id, client=None, use_streaming=True,
+                 poll_interval=0.25, poll_interval_max=2.0, poll_backoff=1.5):
+        """
+        Controla la ejecución de un run del asistente de OpenAI.
+
+        Usa la API de eventos en streaming cuando está disponible y, si falla,
+        recurre a un sondeo con espera adaptativa en lugar de un ciclo continuo.
+
+        Args:
+            assistant_id (str): ID del asistente a ejecutar.
+            client (module | OpenAI, optional): Cliente de OpenAI. Por defecto el módulo `openai`.
+            use_streaming (bool): Indica si se intenta consumir el stream de eventos.
+            poll_interval (float): Espera inicial (segundos) entre consultas del sondeo.
+            poll_interval_max (float): Espera máxima (segundos) entre consultas del sondeo.
+            poll_backoff (float): Factor de crecimiento de la espera entre consultas.
+        """
+        self.assistant_id = assistant_id
+        self.client = client or openai
+        self.use_streaming = use_streaming
+        self.poll_interval = poll_interval
+        self.poll_interval_max = poll_interval_max
+        self.poll_backoff = poll_backoff
+
+    @property
+    def runs(self):
+        return self.client.beta.threads.runs
+
+    def drive(self, thread_id, tool_handler, budget=None, on_text_delta=None):
+        """
+        Lleva un run desde su creación hasta un estado terminal, atendiendo cualquier
+        número de rondas de herramientas dentro de un presupuesto total de latencia.
+
+        Si el presupuesto se agota el run se cancela y el resultado se marca con `timed_out`.
+
+        Args:
+            thread_id (str): ID del hilo de conversación.
+            tool_handler (callable): Recibe las llamadas a herramientas y devuelve la lista de salidas.
+            budget (float, optional): Tiempo total máximo (segundos) para el run.
+            on_text_delta (callable, optional): Función que recibe cada fragmento de texto del asistente.
+
+        Returns:
+            dict: {'run', 'timed_out', 'elapsed', 'rounds'} donde 'rounds' contiene los tiempos de cada ronda.
+        """
+        start = time.monotonic()
+        deadline = start + budget if budget is not None else None
+        rounds = []
+
+        round_start = time.monotonic()
+        run = self.start_run(thread_id, on_text_delta=on_text_delta, deadline=deadline)
+        rounds.append({"round": 0, "status": run.status, "run_seconds": time.monotonic() - round_start})
+
+        while run.status == "requires_action" and not self._expired(deadline):
+            round_start = time.monotonic()
+            tool_outputs = tool_handler(run.required_action.submit_tool_outputs.tool_calls)
+            tools_seconds = time.monotonic() - round_start
+
+            if self._expired(deadline):
+                break
+
+            run = self.submit_tool_outputs(
+                thread_id,
+                run.id,
+                tool_outputs,
+                on_text_delta=on_text_delta,
+                deadline=deadline,
+            )
+            rounds.append({
+                "round": len(rounds),
+                "status": run.status,
+                "tools_seconds": tools_seconds,
+                "run_seconds": time.monotonic() - round_start - tools_seconds,
+            })
+
+        timed_out = run.status not in ESTADOS_TERMINALES
+        if timed_out:
+            logger.warning("El run excedió el presupuesto; se cancela", extra={"ctx": {"run_id": run.id, "budget": budget}})
+            run = self.cancel_run(thread_id, run)
+
+        elapsed = time.monotonic() - start
+        logger.info("Run terminado", extra={"ctx": {"run_id": run.id, "status": run.status, "elapsed": elapsed, "rounds": rounds}})
+        return {"run": run, "timed_out": timed_out, "elapsed": elapsed, "rounds": rounds}
+
+    def cancel_run(self, thread_id, run, timeout=5.0):
+        """
+        Cancela un run y espera brevemente a que la cancelación se confirme.
+
+        Args:
+            thread_id (str): ID del hilo de conversación.
+            run (Run): Run a cancelar.
+            timeout (float): Tiempo máximo de espera (segundos) para la confirmación.
+
+        Returns:
+            Run: Objeto run en su último estado conocido.
+        """
+        try:
+            run = self.runs.cancel(thread_id=thread_id, run_id=run.id)
+            return self.wait_for_run(thread_id, run, timeout=timeout)
+        except Exception as e:
+            logger.error("Error al cancelar el run", extra={"ctx": {"run_id": run.id, "error": str(e)}})
+            return run
+
+    def start_run(self, thread_id, on_text_delta=None, deadline=None):
+        """
+        Crea un run en el hilo y espera a que llegue a un estado final o requiera acción.
+
+        Args:
+            thread_id (str): ID del hilo de conversación.
+            on_text_delta (callable, optional): Función que recibe cada fragmento de texto del asistente.
+            deadline (float, optional): Instante límite según `time.monotonic()`.
+
+        Returns:
+            Run: Objeto run en su último estado conocido.
+        """
+        if self.use_streaming:
+            estado = {"run": None}
+            try:
+                stream = self.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=self.assistant_id,
+                    stream=True,
+                    **self._timeout_kwargs(deadline),
+                )
+                self._consume_stream(stream, estado, on_text_delta, deadline)
+                run = estado["run"]
+                if run is not None and run.status in ESTADOS_FINALES:
+                    return run
+            except Exception as e:
+                logger.warning("Streaming no disponible, se usa sondeo", extra={"ctx": {"error": str(e)}})
+                run = estado["run"]
+
+            # Si el stream alcanzó a crear el run, se sondea ese mismo run
+            if run is not None:
+                return self.wait_for_run(thread_id, run, timeout=self._remaining(deadline))
+
+        run = self.runs.create(
+            thread_id=thread_id,
+            assistant_id=self.assistant_id,
+        )
+        return self.wait_for_run(thread_id, run, timeout=self._remaining(deadline))
+
+    def submit_tool_outputs(self, thread_id, run_id, tool_outputs, on_text_delta=None, deadline=None):
+        """
+        Envía las salidas de las herramientas y espera el siguiente estado del run.
+
+        Args:
+            thread_id (str): ID del hilo de conversación.
+            run_id (str): ID del run que solicitó las herramientas.
+            tool_outputs (list): Lista de diccionarios {'tool_call_id', 'output'}.
+            on_text_delta (callable, optional): Función que recibe cada fragmento de texto del asistente.
+            deadline (float, optional): Instante límite según `time.monotonic()`.
+
+        Returns:
+            Run: Objeto run en su último estado conocido.
+        """
+        if self.use_streaming:
+            estado = {"run": None}
+            try:
+                stream = self.runs.submit_tool_outputs(
+                    thread_id=thread_id,
+                    run_id=run_id,
+                    tool_outputs=tool_outputs,
+                    stream=True,
+                    **self._timeout_kwargs(deadline),
+                )
+                self._consume_stream(stream, estado, on_text_delta, deadline)
+                run = estado["run"]
+                if run is not None and run.status in ESTADOS_FINALES:
+                    return run
+            except Exception as e:
+                logger.warning("Streaming no disponible, se usa sondeo", extra={"ctx": {"error": str(e)}})
+                run = estado["run"]
+
+            if run is not None:
+                return self.wait_for_run(thread_id, run, timeout=self._remaining(deadline))
+            # Las salidas pudieron haberse enviado antes del fallo; se consulta el run
+            run = self.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            if run.status != "requires_action":
+                return self.wait_for_run(thread_id, run, timeout=self._remaining(deadline))
+
+        run = self.runs.submit_tool_outputs(
+            thread_id=thread_id,
+            run_id=run_id,
+            tool_outputs=tool_outputs,
+        )
+        return self.wait_for_run(thread_id, run, timeout=self._remaining(deadline))
+
+    def wait_for_run(self, thread_id, run, timeout=None):
+        """
+        Sondea el run con espera adaptativa hasta que salga de los estados en curso.
+
+        Args:
+            thread_id (str): ID del hilo de conversación.
+            run (Run): Run a sondear.
+            timeout (float, optional): Tiempo máximo de espera en segundos.
+
+        Returns:
+            Run: Objeto run en su último estado conocido.
+        """
+        interval = self.poll_interval
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        while run.status not in ESTADOS_FINALES:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                interval = min(interval, remaining)
+            time.sleep(interval)
+            interval = min(interval * self.poll_backoff, self.poll_interval_max)
+            run = self.runs.retrieve(thread_id=thread_id, run_id=run.id)
+
+        return run
+
+    def _consume_stream(self, stream, estado, on_text_delta=None, deadline=None):
+        """
+        Consume los eventos del stream guardando en `estado['run']` el último estado del run.
+
+        El estado se actualiza con cada evento para que, si el stream falla a la mitad,
+        se pueda seguir sondeando el mismo run. Deja de leer (cerrando el stream) si se
+        alcanza el instante límite.
+
+        Args:
+            stream (Stream): Stream de eventos del asistente.
+            estado (dict): Diccionario donde se guarda el último run recibido.
+            on_text_delta (callable, optional): Función que recibe cada fragmento de texto.
+            deadline (float, optional): Instante límite según `time.monotonic()`.
+        """
+        with stream:
+            for event in stream:
+                if self._expired(deadline):
+                    break
+                if event.event.startswith("thread.run.") and not event.event.startswith("thread.run.step"):
+                    estado["run"] = event.data
+                elif event.event == "thread.message.delta" and on_text_delta:
+                    for part in event.data.delta.content or []:
+                        if part.type == "text" and part.text and part.text.value:
+                            on_text_delta(part.text.value)
+                elif event.event == "error":
+                    raise RuntimeError(f"Error en el stream del asistente: {event.data}")
+
+    @staticmethod
+    def _remaining(deadline):
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    @staticmethod
+    def _expired(deadline):
+        return deadline is not None and time.monotonic() >= deadline
+
+    def _timeout_kwargs(self, deadline):
+        remaining = self._remaining(deadline)
+        if remaining is None:
+            return {}
+        # Tiempo de lectura del stream acotado por lo que resta del presupuesto
+        return {"timeout": max(remaining, 1.0)}
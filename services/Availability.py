@@ -0,0 +1,343 @@
+import bisect
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from services.GoogleCalendar import CALENDARIO_CITAS, ZONA_HORARIA
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class IntervalIndex:
+    """
+    Intervalos ocupados, fusionados y ordenados, en segundos desde epoch.
+
+    `starts` y `ends` son listas paralelas; como los intervalos no se traslapan,
+    ambas quedan ordenadas y se pueden consultar con `bisect`.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def add(self, start, end):
+        """
+        Agrega un intervalo ocupado, fusionándolo con los que se traslapen o toquen.
+
+        Args:
+            start (float): Inicio (epoch).
+            end (float): Fin (epoch).
+        """
+        if end <= start:
+            return
+        i = bisect.bisect_left(self.ends, start)
+        j = bisect.bisect_right(self.starts, end)
+        if i < j:
+            start = min(start, self.starts[i])
+            end = max(end, self.ends[j - 1])
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def replace(self, window_start, window_end, intervals):
+        """
+        Sustituye los intervalos de una ventana por los indicados.
+
+        Los intervalos que cruzan los bordes de la ventana conservan la parte exterior.
+
+        Args:
+            window_start (float): Inicio de la ventana (epoch).
+            window_end (float): Fin de la ventana (epoch).
+            intervals (iterable): Pares (inicio, fin) ocupados dentro de la ventana.
+        """
+        i = bisect.bisect_right(self.ends, window_start)
+        j = bisect.bisect_left(self.starts, window_end)
+        outside = []
+        if i < j and self.starts[i] < window_start:
+            outside.append((self.starts[i], window_start))
+        if i < j and self.ends[j - 1] > window_end:
+            outside.append((window_end, self.ends[j - 1]))
+        del self.starts[i:j]
+        del self.ends[i:j]
+        for start, end in outside:
+            self.add(start, end)
+        for start, end in intervals:
+            self.add(max(start, window_start), min(end, window_end))
+
+    def prune(self, before):
+        """
+        Descarta los intervalos que terminan antes de un instante.
+
+        Args:
+            before (float): Instante (epoch) a partir del cual se conservan los intervalos.
+        """
+        i = bisect.bisect_right(self.ends, before)
+        del self.starts[:i]
+        del self.ends[:i]
+
+    def is_free(self, start, end):
+        """
+        Indica si el intervalo no se traslapa con ningún intervalo ocupado.
+
+        Args:
+            start (float): Inicio (epoch).
+            end (float): Fin (epoch).
+
+        Returns:
+            bool: True si está libre.
+        """
+        i = bisect.bisect_right(self.ends, start)
+        return i >= len(self.starts) or self.starts[i] >= end
+
+    def free_slots(self, window_start, window_end, duration, step, limit):
+        """
+        Busca huecos libres de `duration` segundos dentro de una ventana.
+
+        Args:
+            window_start (float): Inicio de la ventana (epoch).
+            window_end (float): Fin de la ventana (epoch).
+            duration (float): Duración de cada espacio (segundos).
+            step (float): Los inicios se alinean a múltiplos de este valor (segundos).
+            limit (int): Número máximo de espacios.
+
+        Returns:
+            list: Pares (inicio, fin) libres.
+        """
+        slots = []
+        cursor = _alinear(window_start, step)
+        i = bisect.bisect_right(self.ends, cursor)
+        while cursor + duration <= window_end and len(slots) < limit:
+            if i < len(self.starts) and self.starts[i] < cursor + duration:
+                cursor = _alinear(max(cursor, self.ends[i]), step)
+                i += 1
+                continue
+            slots.append((cursor, cursor + duration))
+            cursor += duration
+        return slots
+
+
+def _alinear(value, step):
+    return -(-value // step) * step
+
+
+class AvailabilityEngine:
+    def __init__(self, calendar_manager=None, calendar_ids=None, horizon_days=14, refresh_interval=60.0,
+                 near_days=2, full_refresh_interval=3600.0, opening=(10, 0), closing=(19, 0),
+                 workdays=(0, 1, 2, 3, 4, 5), step_minutes=30, time_zone=ZONA_HORARIA):
+        """
+        Disponibilidad de la agenda a partir de la API freebusy de Google Calendar.
+
+        Los intervalos ocupados de los calendarios se guardan en memoria en un
+        `IntervalIndex`, de modo que buscar espacios libres no requiere llamar a la API.
+        Un hilo de fondo lo actualiza de forma incremental: cada `refresh_interval`
+        segundos vuelve a consultar solo los próximos `near_days` días, extiende el
+        horizonte un día cuando el tiempo lo alcanza y cada `full_refresh_interval`
+        segundos consulta el horizonte completo.
+
+        Args:
+            calendar_manager (GoogleCalendarManager, optional): Gestor usado para consultar
+                freebusy. Normalmente se asocia después con `bind`.
+            calendar_ids (list, optional): Calendarios cuyo tiempo ocupado bloquea la agenda.
+            horizon_days (int): Días hacia adelante que se mantienen en memoria.
+            refresh_interval (float): Segundos entre cada actualización.
+            near_days (int): Días próximos que se vuelven a consultar en cada actualización.
+            full_refresh_interval (float): Segundos entre cada consulta del horizonte completo.
+            opening (tuple): Hora y minuto de apertura.
+            closing (tuple): Hora y minuto de cierre.
+            workdays (tuple): Días laborables (0 = lunes).
+            step_minutes (int): Los horarios propuestos se alinean a este número de minutos.
+            time_zone (str): Zona horaria del negocio.
+        """
+        self.calendar_manager = calendar_manager
+        self.calendar_ids = calendar_ids or [CALENDARIO_CITAS]
+        self.horizon = timedelta(days=horizon_days)
+        self.refresh_interval = refresh_interval
+        self.near_window = timedelta(days=near_days)
+        self.full_refresh_interval = full_refresh_interval
+        self.opening = opening
+        self.closing = closing
+        self.workdays = set(workdays)
+        self.step = step_minutes * 60
+        self.tz = ZoneInfo(time_zone)
+        self.index = IntervalIndex()
+        self._lock = threading.Lock()
+        self._loaded_until = None
+        self._last_full = 0.0
+        self._pid = None
+
+    def bind(self, calendar_manager):
+        """
+        Asocia el gestor de Google Calendar con el que se consulta freebusy.
+
+        Args:
+            calendar_manager (GoogleCalendarManager): Gestor del calendario.
+        """
+        self.calendar_manager = calendar_manager
+
+    def _ensure_started(self):
+        # Se inicia en cada worker después del fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.index = IntervalIndex()
+            self._loaded_until = None
+            self._last_full = 0.0
+        threading.Thread(target=self._refresh_loop, name="availability-refresh", daemon=True).start()
+
+    def _ensure_loaded(self):
+        self._ensure_started()
+        if self._loaded_until is None:
+            self.refresh(full=True)
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Error al actualizar la disponibilidad")
+
+    def _busy(self, time_min, time_max):
+        busy = self.calendar_manager.get_busy_intervals(
+            self.calendar_ids, time_min.isoformat(), time_max.isoformat(), time_zone=str(self.tz)
+        )
+        return [
+            (datetime.fromisoformat(b["start"]).timestamp(), datetime.fromisoformat(b["end"]).timestamp())
+            for periods in busy.values()
+            for b in periods
+        ]
+
+    def refresh(self, full=False):
+        """
+        Actualiza el índice con freebusy.
+
+        Sin `full` solo se consultan los próximos días y, si hace falta, el tramo nuevo
+        al final del horizonte; con `full` (o si toca) se consulta el horizonte completo.
+
+        Args:
+            full (bool): Si es True se consulta todo el horizonte.
+        """
+        now = datetime.now(self.tz)
+        horizon_end = now + self.horizon
+        full = (
+            full
+            or self._loaded_until is None
+            or time.monotonic() - self._last_full >= self.full_refresh_interval
+        )
+
+        if full:
+            windows = [(now, horizon_end)]
+        else:
+            near_end = min(now + self.near_window, horizon_end)
+            windows = [(now, near_end)]
+            if self._loaded_until < horizon_end:
+                # El horizonte avanza por días para no consultar un tramo nuevo en cada ronda
+                windows.append((max(self._loaded_until, near_end), horizon_end + timedelta(days=1)))
+
+        updates = [(start, end, self._busy(start, end)) for start, end in windows]
+        with self._lock:
+            for start, end, intervals in updates:
+                self.index.replace(start.timestamp(), end.timestamp(), intervals)
+            self.index.prune(now.timestamp())
+            self._loaded_until = max(self._loaded_until or now, windows[-1][1])
+            if full:
+                self._last_full = time.monotonic()
+        logger.debug("Disponibilidad actualizada", extra={"ctx": {"full": full, "windows": len(windows)}})
+
+    def is_free(self, start, end):
+        """
+        Indica si un horario está libre en los calendarios de la agenda.
+
+        Dentro del horizonte se responde con el índice en memoria; más allá se consulta
+        freebusy solo para ese horario.
+
+        Args:
+            start (str): Inicio (ISO 8601).
+            end (str): Fin (ISO 8601).
+
+        Returns:
+            bool: True si el horario no se traslapa con ningún evento.
+        """
+        self._ensure_loaded()
+        start_ts, end_ts = self._epoch(start), self._epoch(end)
+        if end_ts > self._loaded_until.timestamp():
+            return not self._busy(datetime.fromtimestamp(start_ts, self.tz), datetime.fromtimestamp(end_ts, self.tz))
+        with self._lock:
+            return self.index.is_free(start_ts, end_ts)
+
+    def reservar(self, start, end):
+        """
+        Marca un intervalo como ocupado sin esperar a la siguiente actualización.
+
+        Args:
+            start (str): Inicio (ISO 8601).
+            end (str): Fin (ISO 8601).
+        """
+        with self._lock:
+            self.index.add(self._epoch(start), self._epoch(end))
+
+    def _epoch(self, value):
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=self.tz)
+        return parsed.timestamp()
+
+    def next_free_slots(self, duration_minutes=60, count=3, after=None, before=None):
+        """
+        Devuelve los siguientes espacios libres dentro del horario del negocio.
+
+        Args:
+            duration_minutes (int): Duración de la cita en minutos.
+            count (int): Número de espacios a devolver.
+            after (str, optional): Buscar a partir de esta fecha/hora (ISO 8601). Por defecto ahora.
+            before (str, optional): No proponer espacios que terminen después de esta fecha/hora.
+
+        Returns:
+            dict: Resultado con la lista de espacios {'start', 'end'} en la zona horaria del negocio.
+        """
+        try:
+            self._ensure_loaded()
+            now = datetime.now(self.tz)
+            start = max(datetime.fromtimestamp(self._epoch(after), self.tz), now) if after else now
+            limit = min(
+                datetime.fromtimestamp(self._epoch(before), self.tz) if before else self._loaded_until,
+                self._loaded_until,
+            )
+            duration = int(duration_minutes) * 60
+
+            slots = []
+            with self._lock:
+                day = start.date()
+                while len(slots) < count and datetime.combine(day, datetime.min.time(), self.tz) < limit:
+                    if day.weekday() in self.workdays:
+                        opening = datetime.combine(day, datetime.min.time(), self.tz).replace(
+                            hour=self.opening[0], minute=self.opening[1])
+                        closing = opening.replace(hour=self.closing[0], minute=self.closing[1])
+                        window_start = max(opening, start).timestamp()
+                        window_end = min(closing, limit).timestamp()
+                        slots.extend(self.index.free_slots(
+                            window_start, window_end, duration, self.step, count - len(slots)
+                        ))
+                    day += timedelta(days=1)
+
+            if not slots:
+                return {"message": "No hay horarios disponibles en el periodo consultado.", "data": []}
+
+            return {
+                "message": "La operación se completó exitosamente.",
+                "data": [
+                    {
+                        "start": datetime.fromtimestamp(s, self.tz).isoformat(),
+                        "end": datetime.fromtimestamp(e, self.tz).isoformat(),
+                    }
+                    for s, e in slots
+                ],
+            }
+        except Exception as e:
+            logger.exception("Error al buscar horarios disponibles")
+            return {"message": "Error inesperado al buscar horarios disponibles.", "error": str(e)}
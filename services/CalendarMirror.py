@@ -0,0 +1,367 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+from services.GoogleCalendar import CALENDARIO_CITAS, ZONA_HORARIA
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+# Campos de cada evento que se copian; 'status' indica los eventos cancelados
+CAMPOS_SINCRONIZACION = "id,status,summary,description,location,start,end"
+
+
+class CalendarMirror:
+    def __init__(self, path, calendar_id=CALENDARIO_CITAS, interval=60.0, page_size=250, time_zone=ZONA_HORARIA):
+        """
+        Copia local (SQLite en modo WAL) de los eventos del calendario de citas.
+
+        La primera sincronización copia el calendario completo y guarda el `nextSyncToken`
+        que devuelve Google; las siguientes envían ese token y solo reciben los eventos
+        creados, modificados o cancelados desde entonces. Si Google invalida el token
+        (410 Gone) se vuelve a copiar todo. Un solo worker sincroniza a la vez; todos
+        leen del mismo archivo.
+
+        Los eventos quedan indexados por ID, por hora de inicio y por los trigramas del
+        título en minúsculas (donde va el nombre del cliente), de modo que buscar un nombre
+        no recorre todo el calendario. El resultado se confirma con la misma regla que
+        aplica el gestor sobre los eventos de la API (`texto.lower() in summary.lower()`).
+
+        Args:
+            path (str): Ruta del archivo SQLite.
+            calendar_id (str): Calendario que se copia.
+            interval (float): Segundos entre sincronizaciones.
+            page_size (int): Eventos por página al consultar la API (máximo 2500).
+            time_zone (str): Zona con la que se interpretan las fechas sin zona horaria.
+        """
+        self.path = path
+        self.calendar_id = calendar_id
+        self.interval = interval
+        self.page_size = min(page_size, 2500)
+        self.tz = ZoneInfo(time_zone)
+        self.manager = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                calendar_id TEXT NOT NULL,
+                event_id TEXT NOT NULL,
+                event TEXT NOT NULL,
+                summary_lower TEXT NOT NULL DEFAULT '',
+                start_ts REAL,
+                end_ts REAL,
+                synced_at REAL NOT NULL,
+                PRIMARY KEY (calendar_id, event_id)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_start ON events (calendar_id, start_ts)")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS calendar_sync_state (
+                calendar_id TEXT PRIMARY KEY,
+                sync_token TEXT,
+                last_sync REAL NOT NULL DEFAULT 0,
+                lease_until REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS event_titles USING fts5(
+                summary_lower, calendar_id UNINDEXED, event_id UNINDEXED, tokenize = 'trigram'
+            )
+            """
+        )
+
+    def bind(self, manager):
+        """
+        Asocia el gestor de Google Calendar con el que se sincroniza el espejo.
+
+        Args:
+            manager (GoogleCalendarManager): Gestor usado para leer los eventos.
+        """
+        self.manager = manager
+
+    def start(self):
+        """Inicia (una vez por worker) el hilo de sincronización periódica."""
+        if self._pid == os.getpid() or self.manager is None:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._sync_loop, name="calendar-mirror", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _sync_loop(self):
+        while True:
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Error al sincronizar el espejo del calendario", extra={"ctx": {"calendar_id": self.calendar_id}})
+            time.sleep(self.interval)
+
+    def ready(self):
+        """
+        Indica si el calendario ya se copió completo al menos una vez.
+
+        Returns:
+            bool: True si el espejo puede atender consultas.
+        """
+        row = self._connect().execute(
+            "SELECT sync_token FROM calendar_sync_state WHERE calendar_id = ?", (self.calendar_id,)
+        ).fetchone()
+        return bool(row and row[0])
+
+    def _claim(self, now):
+        # Toma la sincronización si toca y ningún otro worker la tiene
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO calendar_sync_state (calendar_id) VALUES (?)", (self.calendar_id,))
+            sync_token, last_sync, lease_until = conn.execute(
+                "SELECT sync_token, last_sync, lease_until FROM calendar_sync_state WHERE calendar_id = ?",
+                (self.calendar_id,),
+            ).fetchone()
+            if lease_until > now or now - last_sync < self.interval:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE calendar_sync_state SET lease_until = ? WHERE calendar_id = ?",
+                (now + max(self.interval, 300), self.calendar_id),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return {"sync_token": sync_token}
+
+    def sync(self, force_full=False):
+        """
+        Sincroniza el espejo con Google Calendar si corresponde.
+
+        Args:
+            force_full (bool): Si es True se copia todo el calendario aunque haya token.
+
+        Returns:
+            int: Número de eventos recibidos, o None si no correspondía sincronizar.
+        """
+        now = time.time()
+        claim = self._claim(now)
+        if claim is None and not force_full:
+            return None
+        sync_token = None if force_full else claim["sync_token"]
+
+        try:
+            try:
+                count, sync_token = self._pull(sync_token, now)
+            except HttpError as error:
+                if sync_token is None or error.resp.status != 410:
+                    raise
+                # El token expiró o Google lo invalidó: se copia todo de nuevo
+                logger.warning("syncToken del calendario inválido; copia completa", extra={"ctx": {"calendar_id": self.calendar_id}})
+                count, sync_token = self._pull(None, now)
+        except Exception:
+            self._connect().execute(
+                "UPDATE calendar_sync_state SET lease_until = 0 WHERE calendar_id = ?", (self.calendar_id,)
+            )
+            raise
+
+        self._connect().execute(
+            "UPDATE calendar_sync_state SET sync_token = ?, last_sync = ?, lease_until = 0 WHERE calendar_id = ?",
+            (sync_token, now, self.calendar_id),
+        )
+        return count
+
+    def _pull(self, sync_token, now):
+        # Recorre las páginas de events.list; sin token es una copia completa
+        full = sync_token is None
+        params = {
+            "calendarId": self.calendar_id,
+            "singleEvents": True,
+            "maxResults": self.page_size,
+            "fields": f"nextPageToken,nextSyncToken,items({CAMPOS_SINCRONIZACION})",
+        }
+        if full:
+            params["showDeleted"] = False
+        else:
+            params["syncToken"] = sync_token
+
+        count = 0
+        while True:
+            result = self.manager._execute(self.manager.service.events().list(**params), "events.list")
+            items = result.get("items", [])
+            count += len(items)
+            self.upsert([e for e in items if e.get("status") != "cancelled"], synced_at=now)
+            self.delete([e["id"] for e in items if e.get("status") == "cancelled"])
+
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+            params["pageToken"] = page_token
+
+        if full:
+            # Lo que no llegó en la copia completa ya no existe en el calendario
+            conn = self._connect()
+            stale = [
+                row[0] for row in conn.execute(
+                    "SELECT event_id FROM events WHERE calendar_id = ? AND synced_at < ?", (self.calendar_id, now)
+                )
+            ]
+            self.delete(stale)
+
+        logger.info("Espejo del calendario sincronizado", extra={"ctx": {"calendar_id": self.calendar_id, "full": full, "events": count}})
+        return count, result.get("nextSyncToken")
+
+    def _epoch(self, value):
+        if not value:
+            return None
+        if isinstance(value, dict):
+            value = value.get("dateTime") or value.get("date")
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00")) if isinstance(value, str) else value
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=self.tz)
+        return parsed.timestamp()
+
+    def upsert(self, events, synced_at=None):
+        """
+        Guarda o reemplaza eventos en el espejo (también tras escribir en el calendario).
+
+        Args:
+            events (list): Eventos de Google Calendar con 'id', 'summary', 'start' y 'end'.
+            synced_at (float, optional): Marca de tiempo de la copia. Por defecto ahora.
+        """
+        if not events:
+            return
+        synced_at = synced_at or time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for event in events:
+                summary_lower = (event.get("summary") or "").lower()
+                conn.execute(
+                    "DELETE FROM event_titles WHERE calendar_id = ? AND event_id = ?", (self.calendar_id, event["id"])
+                )
+                conn.execute(
+                    "INSERT INTO event_titles (summary_lower, calendar_id, event_id) VALUES (?, ?, ?)",
+                    (summary_lower, self.calendar_id, event["id"]),
+                )
+                conn.execute(
+                    """
+                    INSERT OR REPLACE INTO events
+                        (calendar_id, event_id, event, summary_lower, start_ts, end_ts, synced_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        self.calendar_id,
+                        event["id"],
+                        json.dumps(event, ensure_ascii=False),
+                        summary_lower,
+                        self._epoch(event.get("start")),
+                        self._epoch(event.get("end")),
+                        synced_at,
+                    ),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, event_ids):
+        """
+        Elimina eventos del espejo.
+
+        Args:
+            event_ids (list): IDs de los eventos.
+        """
+        if not event_ids:
+            return
+        params = [(self.calendar_id, event_id) for event_id in event_ids]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("DELETE FROM events WHERE calendar_id = ? AND event_id = ?", params)
+            conn.executemany("DELETE FROM event_titles WHERE calendar_id = ? AND event_id = ?", params)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def get(self, event_id):
+        """
+        Busca un evento por su ID.
+
+        Args:
+            event_id (str): ID del evento.
+
+        Returns:
+            dict: Evento de Google Calendar, o None si no está en el espejo.
+        """
+        row = self._connect().execute(
+            "SELECT event FROM events WHERE calendar_id = ? AND event_id = ?", (self.calendar_id, event_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, text=None, time_min=None, time_max=None, limit=None):
+        """
+        Busca eventos por texto del título y rango de tiempo, en orden de inicio.
+
+        Args:
+            text (str | list, optional): Texto (o textos) que deben aparecer en el título,
+                sin distinguir mayúsculas, igual que `texto.lower() in summary.lower()`. Los
+                textos de 3 o más caracteres se buscan en el índice de trigramas.
+            time_min (str, optional): Solo eventos que terminan después de esta fecha (ISO 8601;
+                sin zona horaria se interpreta en la zona del negocio).
+            time_max (str, optional): Solo eventos que empiezan antes de esta fecha (ISO 8601).
+            limit (int, optional): Número máximo de eventos.
+
+        Returns:
+            list: Eventos de Google Calendar.
+        """
+        sql = "SELECT event FROM events WHERE calendar_id = ?"
+        params = [self.calendar_id]
+        if time_min:
+            sql += " AND end_ts > ?"
+            params.append(self._epoch(time_min))
+        if time_max:
+            sql += " AND start_ts < ?"
+            params.append(self._epoch(time_max))
+        for value in ([text] if isinstance(text, str) else text or []):
+            if not value:
+                continue
+            value = value.lower()
+            if len(value) >= 3:
+                sql += (
+                    " AND event_id IN (SELECT event_id FROM event_titles"
+                    " WHERE event_titles MATCH ? AND calendar_id = ?)"
+                )
+                params += ['summary_lower : "' + value.replace('"', '""') + '"', self.calendar_id]
+            # Confirmación exacta de la subcadena (y única condición en textos cortos)
+            sql += " AND instr(summary_lower, ?) > 0"
+            params.append(value)
+        sql += " ORDER BY start_ts"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [json.loads(row[0]) for row in self._connect().execute(sql, params)]
@@ -0,0 +1,177 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from services.ClienteRecord import ClienteRecord
+
+
+# Estas normalizaciones son las mismas que aplican las fórmulas de búsqueda de
+# services/AirTable.py (formula_telefono, formula_correo, formula_nombre), de modo que
+# un identificador encuentra al mismo cliente en la caché, en el espejo y en Airtable.
+
+
+def normalizar_telefono(valor):
+    """
+    Deja solo los dígitos de un teléfono.
+
+    Args:
+        valor (str): Teléfono en cualquier formato.
+
+    Returns:
+        str: Dígitos del teléfono, o cadena vacía.
+    """
+    return re.sub(r"\D", "", str(valor or ""))
+
+
+def normalizar_correo(valor):
+    """
+    Normaliza un correo electrónico para compararlo.
+
+    Args:
+        valor (str): Correo electrónico.
+
+    Returns:
+        str: Correo sin espacios y en minúsculas.
+    """
+    return str(valor or "").strip().lower()
+
+
+def normalizar_nombre(valor):
+    """
+    Normaliza un nombre: minúsculas y con espacios simples (conserva los acentos).
+
+    Args:
+        valor (str): Nombre completo.
+
+    Returns:
+        str: Nombre normalizado.
+    """
+    return " ".join(str(valor or "").lower().split())
+
+
+class ClientCache:
+    def __init__(self, ttl=300, max_entries=1024):
+        """
+        Caché en memoria de registros de la tabla 'Clientes' con expiración y desalojo LRU.
+
+        Cada registro se guarda como `ClienteRecord` y se indexa por su ID, teléfono, correo
+        y nombre normalizados, de modo que las consultas repetidas dentro de una
+        conversación no vuelven a ir a Airtable.
+
+        Args:
+            ttl (float): Segundos que un registro se considera vigente.
+            max_entries (int): Número máximo de registros en memoria.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._records = OrderedDict()
+        self._keys = {}
+        self._index = {}
+        self._lock = threading.Lock()
+
+    def put(self, record):
+        """
+        Guarda (o reemplaza) un registro de Airtable.
+
+        Args:
+            record (dict): Registro con 'id' y 'fields'.
+        """
+        if not record or not record.get("id") or self.ttl <= 0:
+            return
+        cliente = ClienteRecord.from_record(record)
+        with self._lock:
+            self._store(cliente)
+
+    def get(self, record_id):
+        """
+        Devuelve un registro por su ID si sigue vigente.
+
+        Args:
+            record_id (str): ID del registro en Airtable.
+
+        Returns:
+            ClienteRecord: Registro, o None si no está en caché o expiró.
+        """
+        with self._lock:
+            return self._lookup(record_id)
+
+    def find(self, identifier):
+        """
+        Busca un registro por teléfono, correo o nombre completo.
+
+        Args:
+            identifier (str): Teléfono, correo o nombre del cliente.
+
+        Returns:
+            ClienteRecord: Registro, o None si no está en caché.
+        """
+        candidates = [
+            ("correo", normalizar_correo(identifier)),
+            ("telefono", normalizar_telefono(identifier)),
+            ("nombre", normalizar_nombre(identifier)),
+        ]
+        with self._lock:
+            for key in candidates:
+                if not key[1]:
+                    continue
+                record_id = self._index.get(key)
+                if record_id:
+                    record = self._lookup(record_id)
+                    if record:
+                        return record
+        return None
+
+    def invalidate(self, record_id):
+        """
+        Elimina un registro de la caché.
+
+        Args:
+            record_id (str): ID del registro.
+        """
+        with self._lock:
+            self._drop(record_id)
+
+    def clear(self):
+        """Vacía la caché."""
+        with self._lock:
+            self._records.clear()
+            self._keys.clear()
+            self._index.clear()
+
+    def _lookup(self, record_id):
+        entry = self._records.get(record_id)
+        if entry is None:
+            return None
+        expires, record = entry
+        if expires < time.monotonic():
+            self._drop(record_id)
+            return None
+        self._records.move_to_end(record_id)
+        return record
+
+    def _store(self, record):
+        record_id = record.id
+        self._drop(record_id)
+
+        keys = [
+            ("correo", normalizar_correo(record.correo_electronico)),
+            ("telefono", normalizar_telefono(record.telefono_movil)),
+            ("nombre", normalizar_nombre(record.nombre_completo)),
+        ]
+        keys = [key for key in keys if key[1]]
+
+        self._records[record_id] = (time.monotonic() + self.ttl, record)
+        self._keys[record_id] = keys
+        for key in keys:
+            self._index[key] = record_id
+
+        while len(self._records) > self.max_entries:
+            oldest = next(iter(self._records))
+            self._drop(oldest)
+
+    def _drop(self, record_id):
+        self._records.pop(record_id, None)
+        for key in self._keys.pop(record_id, []):
+            if self._index.get(key) == record_id:
+                del self._index[key]
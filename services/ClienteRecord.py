@@ -0,0 +1,74 @@
+# Campos de la tabla 'Clientes' que usa el asistente: atributo -> campo de Airtable
+CAMPOS_CLIENTE = {
+    "nombre_completo": "Nombre Completo",
+    "telefono_movil": "Teléfono Móvil",
+    "correo_electronico": "Correo electrónico",
+    "domicilio": "Domicilio",
+    "fecha_nacimiento": "Fecha de Nacimiento",
+    "edad": "Edad",
+    "sexo": "Sexo",
+}
+
+
+class ClienteRecord:
+    """
+    Registro compacto de la tabla 'Clientes'.
+
+    Guarda los campos conocidos como atributos (`__slots__`, sin diccionario por
+    instancia) y solo conserva aparte los campos no previstos. El diccionario con la
+    forma de Airtable se arma bajo demanda con `fields` o `raw`.
+    """
+
+    __slots__ = ("id", "created_time", "_extra", *CAMPOS_CLIENTE)
+
+    def __init__(self, record_id, created_time=None, **valores):
+        self.id = record_id
+        self.created_time = created_time
+        self._extra = None
+        for attr in CAMPOS_CLIENTE:
+            setattr(self, attr, valores.get(attr))
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        Construye el registro a partir de la respuesta de Airtable.
+
+        Args:
+            record (dict): Registro con 'id', 'createdTime' y 'fields'.
+
+        Returns:
+            ClienteRecord: Registro compacto.
+        """
+        fields = record.get("fields", {})
+        instance = cls(
+            record["id"],
+            record.get("createdTime"),
+            **{attr: fields.get(campo) for attr, campo in CAMPOS_CLIENTE.items()},
+        )
+        conocidos = set(CAMPOS_CLIENTE.values())
+        extra = {key: value for key, value in fields.items() if key not in conocidos}
+        instance._extra = extra or None
+        return instance
+
+    @property
+    def fields(self):
+        """dict: Campos con los nombres de Airtable (se omiten los vacíos)."""
+        fields = {
+            campo: getattr(self, attr)
+            for attr, campo in CAMPOS_CLIENTE.items()
+            if getattr(self, attr) is not None
+        }
+        if self._extra:
+            fields.update(self._extra)
+        return fields
+
+    @property
+    def raw(self):
+        """dict: Registro con la forma original de Airtable."""
+        raw = {"id": self.id, "fields": self.fields}
+        if self.created_time:
+            raw["createdTime"] = self.created_time
+        return raw
+
+    def __repr__(self):
+        return f"ClienteRecord(id={self.id!r})"
@@ -1,12 +1,17 @@
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import os
 import base64
 from email.mime.text import MIMEText
 
+from services.GoogleServiceFactory import get_service
+from services.Metrics import medir
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly',  # Para leer mensajes
           'https://www.googleapis.com/auth/gmail.send']      # Para enviar correos
 
@@ -34,7 +39,18 @@ class GmailManager:
             with open('token_gmail.json', 'w') as token:
                 token.write(creds.to_json())
 
-        return build('gmail', 'v1', credentials=creds)
+        return get_service('gmail', 'v1', creds)
+
+    def _execute(self, request, operation):
+        """
+        Ejecuta una solicitud de la API de Gmail registrando su latencia.
+
+        :param request: Solicitud construida con `self.service`.
+        :param operation: Nombre de la operación para las métricas.
+        :return: Respuesta de la API.
+        """
+        with medir("gmail", operation=operation):
+            return request.execute()
 
     def list_messages(self, query='', max_results=10):
         '''
@@ -45,17 +61,15 @@ class GmailManager:
         :return: Lista de mensajes encontrados.
         '''
         try:
-            results = self.service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
+            results = self._execute(self.service.users().messages().list(userId='me', q=query, maxResults=max_results), "messages.list")
             messages = results.get('messages', [])
             if not messages:
-                print("No se encontraron mensajes.")
+                logger.info("No se encontraron mensajes")
             else:
-                for message in messages:
-                    msg = self.service.users().messages().get(userId='me', id=message['id']).execute()
-                    print(f"Mensaje encontrado: {msg['snippet']} con el id: {message['id']}")
+                logger.debug("Mensajes encontrados", extra={"ctx": {"message_ids": [message['id'] for message in messages]}})
             return messages
         except HttpError as error:
-            print(f"Ocurrió un error: {error}")
+            logger.error("Error al listar mensajes de Gmail", extra={"ctx": {"error": str(error)}})
             return []
 
     def get_message(self, message_id):
@@ -66,17 +80,16 @@ class GmailManager:
         :return: Contenido del mensaje.
         """
         try:
-            message = self.service.users().messages().get(userId='me', id=message_id, format='full').execute()
+            message = self._execute(self.service.users().messages().get(userId='me', id=message_id, format='full'), "messages.get")
             payload = message.get('payload', {})
             headers = payload.get('headers', [])
             subject = next((header['value'] for header in headers if header['name'] == 'Subject'), 'Sin asunto')
             body = base64.urlsafe_b64decode(payload.get('body', {}).get('data', '')).decode('utf-8', errors='ignore')
 
-            print(f"Asunto: {subject}")
-            print(f"Cuerpo: {body}")
+            logger.debug("Mensaje obtenido", extra={"ctx": {"message_id": message_id, "subject_length": len(subject), "body_length": len(body)}})
             return message
         except HttpError as error:
-            print(f"Ocurrió un error: {error}")
+            logger.error("Error al obtener el mensaje de Gmail", extra={"ctx": {"message_id": message_id, "error": str(error)}})
             return None
 
     def send_message(self, to, subject, body_text):
@@ -94,13 +107,13 @@ class GmailManager:
             message['subject'] = subject
             raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
 
-            sent_message = self.service.users().messages().send(
+            sent_message = self._execute(self.service.users().messages().send(
                 userId='me', body={'raw': raw_message}
-            ).execute()
-            print(f"Correo enviado exitosamente: {sent_message['id']}")
+            ), "messages.send")
+            logger.info("Correo enviado", extra={"ctx": {"message_id": sent_message['id']}})
             return sent_message
         except HttpError as error:
-            print(f"Ocurrió un error al enviar el correo: {error}")
+            logger.error("Error al enviar el correo", extra={"ctx": {"error": str(error)}})
             return None
 
 
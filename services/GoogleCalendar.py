@@ -2,23 +2,66 @@ import os.path
 import datetime as dt
 import json
 import pickle
+import random
+import time
+import uuid
+from collections import deque
 
 from datetime import datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
 import sys
-from googleapiclient.discovery import build
 
 #from google.oauth2.credentials import Credentials
 from google.oauth2.service_account import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import httplib2
+
+from services.GoogleServiceFactory import get_service
+from services.Metrics import medir
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
 
 SCOPES =[ "https://www.googleapis.com/auth/calendar", 'https://www.googleapis.com/auth/calendar.readonly']
 
+# Calendario del negocio donde se agendan las citas
+CALENDARIO_CITAS = 'c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com'
+
+# Zona horaria del negocio; las fechas sin zona horaria se interpretan en ella
+ZONA_HORARIA = "America/Mexico_City"
+
+# Días hacia atrás en los que get_appointments busca citas pasadas si no se indica `time_min`
+DIAS_HISTORIAL_CITAS = 365
+
+# Campos de cada evento que se piden a la API (máscara `fields`)
+CAMPOS_EVENTO = "id,summary,description,location,start,end"
+
+# Operaciones por solicitud en lote (la API de Calendar acepta hasta 50)
+MAX_BATCH_SIZE = 50
+
+# Estados de una operación del lote que se reintentan
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
 class GoogleCalendarManager:
-    def __init__(self):
+    def __init__(self, mirror=None, availability=None):
+        """
+        Gestor de Google Calendar.
+
+        Args:
+            mirror (CalendarMirror, optional): Espejo local del calendario de citas; si se indica,
+                las búsquedas de citas se atienden desde él en cuanto termina la primera copia.
+            availability (AvailabilityEngine, optional): Disponibilidad en memoria; si se indica,
+                `create_google_calendar_event` verifica que el horario esté libre y lo reserva.
+        """
         self.service = self._authenticate()
+        self.mirror = mirror
+        if mirror is not None:
+            mirror.bind(self)
+        self.availability = availability
+        if availability is not None:
+            availability.bind(self)
         
     def _authenticate(self):
         
@@ -35,50 +78,245 @@ class GoogleCalendarManager:
 
         # Crear credenciales desde la Service Account
         creds = Credentials.from_service_account_info(credentials_dict, scopes=SCOPES)
+        self.credentials = creds
+
+        # Cliente compartido del proceso para estas credenciales
+        return get_service("calendar", "v3", creds)
+
+    def refresh_credentials(self, margin=300):
+        """
+        Renueva el token de la Service Account si ya expiró o está por expirar.
+
+        Args:
+            margin (int): Segundos de anticipación con los que se renueva el token.
+        """
+        creds = self.credentials
+        if creds.valid and creds.expiry and creds.expiry - datetime.utcnow() > timedelta(seconds=margin):
+            return
+        creds.refresh(Request())
+
+    def _execute(self, request, operation):
+        """
+        Ejecuta una solicitud de la API de Calendar registrando su latencia.
+
+        Args:
+            request (HttpRequest): Solicitud construida con `self.service`.
+            operation (str): Nombre de la operación para las métricas.
+
+        Returns:
+            dict: Respuesta de la API.
+        """
+        with medir("calendar", operation=operation):
+            return request.execute()
+
+    def _usar_espejo(self):
+        if self.mirror is None:
+            return False
+        self.mirror.start()
+        return self.mirror.ready()
+
+    def _registrar_evento(self, event, calendar_id=CALENDARIO_CITAS):
+        # Los eventos devueltos por la API tras escribir reemplazan la copia del espejo
+        if self.mirror is not None and self.mirror.calendar_id == calendar_id:
+            self.mirror.upsert([event])
+
+    def _descartar_evento(self, event_id, calendar_id=CALENDARIO_CITAS):
+        if self.mirror is not None and self.mirror.calendar_id == calendar_id:
+            self.mirror.delete([event_id])
 
-        # Retornar las credenciales
-        return build("calendar", "v3", credentials=creds)
+    def _procesar_lotes(self, builders, operation, max_retries=3, backoff_base=1.0, backoff_max=16.0):
+        """
+        Ejecuta muchas solicitudes agrupándolas en lotes de hasta 50 (BatchHttpRequest).
+
+        Las operaciones que fallan con un error temporal (límite de uso o error del
+        servidor) se vuelven a enviar, solas, en lotes nuevos con espera exponencial.
+        Solo deben pasar por aquí operaciones idempotentes: las inserciones llevan un
+        'id' propio (ver `create_events`) para que un reintento no duplique el evento.
+
+        Args:
+            builders (list): Funciones sin argumentos que construyen cada solicitud.
+            operation (str): Nombre de la operación para las métricas.
+            max_retries (int): Reintentos máximos de cada operación fallida.
+            backoff_base (float): Espera inicial (segundos) entre reintentos.
+            backoff_max (float): Espera máxima (segundos) entre reintentos.
+
+        Returns:
+            list: Por operación, en el mismo orden, una tupla (respuesta, error).
+        """
+        results = [(None, None)] * len(builders)
+        pending = list(range(len(builders)))
+        attempt = 0
+        while pending:
+            retry = []
+            for start in range(0, len(pending), MAX_BATCH_SIZE):
+                chunk = pending[start:start + MAX_BATCH_SIZE]
+                responses = {}
+
+                def callback(request_id, response, exception):
+                    responses[request_id] = (response, exception)
+
+                batch = self.service.new_batch_http_request(callback=callback)
+                for i in chunk:
+                    batch.add(builders[i](), request_id=str(i))
+                try:
+                    with medir("calendar", operation=f"batch.{operation}"):
+                        batch.execute()
+                    failure = None
+                except Exception as e:
+                    # Falló el lote completo (conexión, autenticación); cuenta para cada operación
+                    logger.error("Error en lote de Calendar", extra={"ctx": {"operation": operation, "requests": len(chunk), "error": str(e)}})
+                    failure = e
+
+                for i in chunk:
+                    response, exception = responses.get(str(i), (None, failure))
+                    results[i] = (response, exception)
+                    if exception is not None and attempt < max_retries and _reintentable(exception):
+                        retry.append(i)
+
+            pending = retry
+            if pending:
+                attempt += 1
+                logger.warning("Reintentando operaciones del lote", extra={"ctx": {"operation": operation, "requests": len(pending), "attempt": attempt}})
+                time.sleep(random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt)))
+        return results
+
+    def create_events(self, events, calendar_id=CALENDARIO_CITAS):
+        """
+        Crea muchos eventos en lotes de hasta 50 solicitudes.
+
+        Cada evento sin 'id' recibe uno generado aquí. Si un lote falla después de que
+        Google aplicó la inserción, el reintento responde 409 en lugar de crear una cita
+        duplicada, y el evento ya creado se reporta como exitoso.
+
+        Args:
+            events (list): Cuerpos de los eventos (con 'summary', 'start', 'end', ...).
+            calendar_id (str): ID del calendario.
+
+        Returns:
+            list: Un resultado por evento, en el mismo orden: {'status': 'success', 'data': evento}
+            o {'status': 'error', 'message'}.
+        """
+        events = [event if event.get("id") else {**event, "id": uuid.uuid4().hex} for event in events]
+        builders = [
+            lambda event=event: self.service.events().insert(calendarId=calendar_id, body=event)
+            for event in events
+        ]
+        results = []
+        for event, (response, exception) in zip(events, self._procesar_lotes(builders, "events.insert")):
+            if exception is not None and _estado(exception) == 409:
+                # Un intento anterior ya creó el evento aunque se perdió la respuesta
+                try:
+                    response = self._execute(
+                        self.service.events().get(calendarId=calendar_id, eventId=event["id"]), "events.get"
+                    )
+                    exception = None
+                except Exception as e:
+                    exception = e
+            if exception is not None:
+                results.append({"status": "error", "message": str(exception)})
+                continue
+            self._registrar_evento(response, calendar_id)
+            results.append({"status": "success", "data": response})
+        return results
+
+    def patch_events(self, changes, calendar_id=CALENDARIO_CITAS):
+        """
+        Modifica parcialmente muchos eventos en lotes de hasta 50 solicitudes.
+
+        Args:
+            changes (list): Diccionarios con el 'id' del evento y los campos a cambiar,
+                por ejemplo {'id': '...', 'start': {...}, 'end': {...}}.
+            calendar_id (str): ID del calendario.
+
+        Returns:
+            list: Un resultado por evento, en el mismo orden: {'status': 'success', 'data': evento}
+            o {'status': 'error', 'id', 'message'}.
+        """
+        changes = list(changes)
+        builders = [
+            lambda change=change: self.service.events().patch(
+                calendarId=calendar_id,
+                eventId=change["id"],
+                body={key: value for key, value in change.items() if key != "id"},
+            )
+            for change in changes
+        ]
+        results = []
+        for change, (response, exception) in zip(changes, self._procesar_lotes(builders, "events.patch")):
+            if exception is not None:
+                results.append({"status": "error", "id": change["id"], "message": str(exception)})
+                continue
+            self._registrar_evento(response, calendar_id)
+            results.append({"status": "success", "data": response})
+        return results
+
+    def delete_events(self, event_ids, calendar_id=CALENDARIO_CITAS):
+        """
+        Elimina muchos eventos en lotes de hasta 50 solicitudes.
+
+        Un evento que ya estaba eliminado (404/410) se reporta como eliminado, de modo
+        que repetir la operación es seguro.
+
+        Args:
+            event_ids (list): IDs de los eventos.
+            calendar_id (str): ID del calendario.
+
+        Returns:
+            list: Un resultado por evento, en el mismo orden: {'status': 'success', 'id'}
+            o {'status': 'error', 'id', 'message'}.
+        """
+        event_ids = list(event_ids)
+        builders = [
+            lambda event_id=event_id: self.service.events().delete(calendarId=calendar_id, eventId=event_id)
+            for event_id in event_ids
+        ]
+        results = []
+        for event_id, (_, exception) in zip(event_ids, self._procesar_lotes(builders, "events.delete")):
+            if exception is not None and _estado(exception) not in (404, 410):
+                results.append({"status": "error", "id": event_id, "message": str(exception)})
+                continue
+            self._descartar_evento(event_id, calendar_id)
+            results.append({"status": "success", "id": event_id})
+        return results
             
     def list_upcoming_events(self, max_results=10):
         now = dt.datetime.now().isoformat() + "Z"
         tomorrow = (dt.datetime.now() + dt.timedelta(days=5)).replace(hour=23, minute=59, second=0, microsecond=0).isoformat() + "Z"
         
-        events_result = self.service.events().list(
+        events_result = self._execute(self.service.events().list(
             calendarId='primary', timeMin=now, timeMax=tomorrow,
             maxResults=max_results, singleEvents=True,
             orderBy='startTime'
-        ).execute()
+        ), "events.list")
         events = events_result.get('items', [])
 
         if not events:
-            print('No upcoming events found.')
+            logger.info("No se encontraron próximos eventos")
         else:
             for event in events:
                 start = event['start'].get('dateTime', event['start'].get('date'))
                 end = event['end'].get('dateTime', event['end'].get('date'))
-                #print("EL EVENTO")
-                #print( event )
-                #print("El evento encontrado comienza a las ",start, event['summary'],event['id'])
-                print("El evento ", event['summary'], " comienza a las ", start, " y termina a las ", end, " el identificador es: ", event['id'])
+                logger.debug("Evento encontrado", extra={"ctx": {"event_id": event['id'], "start": start, "end": end}})
         
         return events
     
     def get_google_calendar_events(creds, time_min, time_max):
 
-        service = build('calendar', 'v3', credentials=creds)
+        service = get_service('calendar', 'v3', creds)
 
-        events_result = service.events().list(
-            calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',  
-            timeMin=time_min,
-            timeMax=time_max,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
+        with medir("calendar", operation="events.list"):
+            events_result = service.events().list(
+                calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',  
+                timeMin=time_min,
+                timeMax=time_max,
+                singleEvents=True,
+                orderBy='startTime'
+            ).execute()
 
         events = events_result.get('items', [])
         for event in events:
             start = event['start'].get('dateTime', event['start'].get('date'))
-            print(f"Evento: {event['summary']}, Inicio: {start}")
+            logger.debug("Evento encontrado", extra={"ctx": {"event_id": event.get('id'), "start": start}})
         return events
 
     def create_event(self, summary, start_time, end_time, timezone, attendees=None):
@@ -98,13 +336,44 @@ class GoogleCalendarManager:
             event["attendees"] = [{"email": email} for email in attendees]
 
         try:
-            event = self.service.events().insert(calendarId="primary", body=event).execute()
-            print(f"El evento se ha creado con el id: {event.get('htmlLink')}")
+            event = self._execute(self.service.events().insert(calendarId="primary", body=event), "events.insert")
+            logger.info("Evento creado", extra={"ctx": {"event_id": event.get('id')}})
         except HttpError as error:
-            print(f"An error has occurred: {error}")
+            logger.error("Error al crear el evento", extra={"ctx": {"error": str(error)}})
+
+    def _horario_libre(self, start, end):
+        """
+        Revisa en el motor de disponibilidad si el horario sigue libre antes de agendar.
+
+        Es una protección de mejor esfuerzo, no una garantía: la consulta y la inserción no
+        son atómicas, por lo que dos workers pueden aprobar el mismo horario a la vez. Si
+        la consulta falla se permite agendar, como antes de existir la revisión.
+
+        Args:
+            start (str): Inicio (ISO 8601).
+            end (str): Fin (ISO 8601).
+
+        Returns:
+            bool: False solo si el motor confirma que el horario está ocupado.
+        """
+        if self.availability is None:
+            return True
+        try:
+            return self.availability.is_free(start, end)
+        except Exception as e:
+            logger.warning("No se pudo revisar la disponibilidad; se agenda sin revisar", extra={"ctx": {"start": start, "error": str(e)}})
+            return True
+
+    def _reservar_horario(self, start, end):
+        # La cita ya existe en el calendario; un fallo aquí solo retrasa el índice hasta la siguiente actualización
+        if self.availability is None:
+            return
+        try:
+            self.availability.reservar(start, end)
+        except Exception as e:
+            logger.warning("No se pudo marcar el horario como ocupado", extra={"ctx": {"start": start, "error": str(e)}})
 
     def create_google_calendar_event(self,event_title, start_time):
-        print("Procesamos creación de evento")
         start_time_dt = datetime.fromisoformat(start_time)
         end_time_dt = start_time_dt + timedelta(hours=1)
         end_time = end_time_dt.isoformat()
@@ -122,11 +391,18 @@ class GoogleCalendarManager:
         }
         
         try:
-            print("Procesamos creación de evento TRY")
-            created_event = self.service.events().insert(
+            if not self._horario_libre(start_time, end_time):
+                return {
+                    "message": "El horario solicitado ya está ocupado. Elige otro horario.",
+                    "error": "horario_ocupado"
+                }
+
+            created_event = self._execute(self.service.events().insert(
                 calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com', 
                 body=event
-            ).execute()
+            ), "events.insert")
+            self._registrar_evento(created_event)
+            self._reservar_horario(created_event['start'].get('dateTime'), created_event['end'].get('dateTime'))
         
             return {
             "message": "La operación se completó exitosamente.",
@@ -140,7 +416,7 @@ class GoogleCalendarManager:
         }
 
         except Exception as e:
-            print(f"Error al crear evento: {str(e)}")
+            logger.exception("Error al crear evento")
             raise
     
     def update_event(self, event_id, user_name, new_date):
@@ -157,7 +433,7 @@ class GoogleCalendarManager:
         """
         try:
             # Obtener el evento existente
-            event = self.service.events().get(calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com', eventId=event_id).execute()
+            event = self._execute(self.service.events().get(calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com', eventId=event_id), "events.get")
 
             # Calcular la nueva fecha de fin sumándole 1 hora a la fecha de inicio
             start_time_dt = datetime.fromisoformat(new_date)
@@ -172,13 +448,14 @@ class GoogleCalendarManager:
                 event['summary'] = f"Reagendado por {user_name} - {event.get('summary', 'Evento Actualizado')}"
 
             # Realizar la actualización en Google Calendar
-            updated_event = self.service.events().update(
+            updated_event = self._execute(self.service.events().update(
                 calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',
                 eventId=event_id,
                 body=event
-            ).execute()
+            ), "events.update")
+            self._registrar_evento(updated_event)
 
-            print(f"Evento actualizado: {updated_event.get('htmlLink')}")
+            logger.info("Evento actualizado", extra={"ctx": {"event_id": updated_event.get('id')}})
             # Devolver resultado estandarizado
             return {
                 "message": "La operación se completó exitosamente.",
@@ -192,19 +469,19 @@ class GoogleCalendarManager:
             }
 
         except HttpError as error:
-            print(f"Error al actualizar el evento: {error}")
+            logger.error("Error al actualizar el evento", extra={"ctx": {"event_id": event_id, "error": str(error)}})
             return {"message": "Ocurrió un error al procesar la operación.", "error": str(error)}
 
         except Exception as e:
-            print(f"Error inesperado: {e}")
+            logger.exception("Error inesperado al actualizar el evento")
             return {"message": "Error inesperado al procesar la operación.", "error": str(e)}
         
     def delete_event(self, event_id):
-        self.service.events().delete(calendarId='primary', eventId=event_id).execute()
+        self._execute(self.service.events().delete(calendarId='primary', eventId=event_id), "events.delete")
         return True
 
     def update_google_calendar_event_by_details(self,creds, event_title, start_time, updated_title=None, updated_start=None, updated_end=None):
-        service = build('calendar', 'v3', credentials=creds)
+        service = get_service('calendar', 'v3', creds)
 
         try:
             start_datetime = datetime.fromisoformat(start_time)
@@ -219,11 +496,12 @@ class GoogleCalendarManager:
                 updated_end_datetime = datetime.fromisoformat(updated_end)
                 updated_end = updated_end_datetime.isoformat()
 
-            events = self.get_google_calendar_events(creds, time_min, time_max)
+            if self._usar_espejo():
+                events = self.mirror.find(text=event_title, time_min=time_min, time_max=time_max)
+            else:
+                events = self.get_google_calendar_events(creds, time_min, time_max)
 
             for event in events:
-                print(event['start']['dateTime'])
-                print(new_start_time)
                 if event['summary'] == event_title and event['start']['dateTime'] == new_start_time:
                     if updated_title:
                         event['summary'] = updated_title
@@ -232,23 +510,24 @@ class GoogleCalendarManager:
                     if updated_end:
                         event['end']['dateTime'] = updated_end
 
-                    updated_event = service.events().update(
+                    updated_event = self._execute(service.events().update(
                         calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',
                         eventId=event['id'],
                         body=event
-                    ).execute()
+                    ), "events.update")
+                    self._registrar_evento(updated_event)
 
-                    print(f"Evento actualizado: {updated_event.get('htmlLink')}")
+                    logger.info("Evento actualizado", extra={"ctx": {"event_id": updated_event.get('id')}})
                     return updated_event
 
             return {"status": "not_found", "message": f"No se encontró un evento con el título '{event_title}' y la hora de inicio '{new_start_time}'."}
 
         except Exception as e:
-            print(f"Error al actualizar el evento: {str(e)}")
+            logger.exception("Error al actualizar el evento")
             return {"status": "error", "message": str(e)}
 
     def delete_google_calendar_event_by_details(creds, event_title, start_time):
-        service = build('calendar', 'v3', credentials=creds)
+        service = get_service('calendar', 'v3', creds)
 
         try:
             start_datetime = datetime.fromisoformat(start_time)
@@ -260,76 +539,166 @@ class GoogleCalendarManager:
 
             for event in events:
                 if event['summary'] == event_title and event['start']['dateTime'] == start_time_z:
-                    service.events().delete(
-                        calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',
-                        eventId=event['id']
-                    ).execute()
+                    with medir("calendar", operation="events.delete"):
+                        service.events().delete(
+                            calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',
+                            eventId=event['id']
+                        ).execute()
 
-                    print(f"Evento eliminado: {event.get('summary')} - {event.get('start')['dateTime']}")
+                    logger.info("Evento eliminado", extra={"ctx": {"event_id": event.get('id')}})
                     return {"status": "success", "message": "Evento eliminado con éxito."}
 
             return {"status": "not_found", "message": f"No se encontró un evento con el título '{event_title}' y la hora de inicio '{start_time_z}'."}
 
         except Exception as e:
-            print(f"Error al eliminar el evento: {str(e)}")
+            logger.exception("Error al eliminar el evento")
             return {"status": "error", "message": str(e)}
         
-    def get_appointments(self, user_name, service, future_only):
+    def iter_events(self, calendar_id=CALENDARIO_CITAS, time_min=None, time_max=None, q=None,
+                    fields=CAMPOS_EVENTO, page_size=250):
+        """
+        Recorre los eventos de un calendario página por página, en orden de inicio.
+
+        Es un generador: la página siguiente (`pageToken`) se pide solo cuando se
+        consumieron los eventos de la anterior, así el llamador puede detenerse en
+        cuanto tiene lo que necesita.
+
+        Args:
+            calendar_id (str): ID del calendario.
+            time_min (str, optional): Inicio de la ventana (ISO 8601 con zona horaria).
+            time_max (str, optional): Fin de la ventana (ISO 8601 con zona horaria).
+            q (str, optional): Texto libre que Google busca en título, descripción, lugar y asistentes.
+            fields (str, optional): Campos de cada evento a devolver; None devuelve todos.
+            page_size (int): Eventos por página (máximo 2500).
+
+        Yields:
+            dict: Evento de Google Calendar.
+        """
+        params = {
+            "calendarId": calendar_id,
+            "singleEvents": True,
+            "orderBy": "startTime",
+            "maxResults": min(page_size, 2500),
+        }
+        if time_min:
+            params["timeMin"] = time_min
+        if time_max:
+            params["timeMax"] = time_max
+        if q:
+            params["q"] = q
+        if fields:
+            params["fields"] = f"nextPageToken,items({fields})"
+
+        while True:
+            events_result = self._execute(self.service.events().list(**params), "events.list")
+            yield from events_result.get('items', [])
+
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                return
+            params["pageToken"] = page_token
+
+    def get_busy_intervals(self, calendar_ids, time_min, time_max, time_zone='America/Mexico_City'):
+        """
+        Consulta los intervalos ocupados de uno o más calendarios con la API freebusy.
+
+        Args:
+            calendar_ids (list): IDs de los calendarios.
+            time_min (str): Inicio de la ventana (ISO 8601 con zona horaria).
+            time_max (str): Fin de la ventana (ISO 8601 con zona horaria).
+            time_zone (str): Zona horaria de la respuesta.
+
+        Returns:
+            dict: Por calendario, lista de intervalos {'start', 'end'} ocupados.
+        """
+        body = {
+            "timeMin": time_min,
+            "timeMax": time_max,
+            "timeZone": time_zone,
+            "items": [{"id": calendar_id} for calendar_id in calendar_ids],
+        }
+        result = self._execute(self.service.freebusy().query(body=body), "freebusy.query")
+
+        busy = {}
+        for calendar_id, data in result.get("calendars", {}).items():
+            if data.get("errors"):
+                logger.warning("Error al consultar disponibilidad", extra={"ctx": {"calendar_id": calendar_id, "errors": data["errors"]}})
+            busy[calendar_id] = data.get("busy", [])
+        return busy
+
+    def get_appointments(self, user_name, service, future_only, time_min=None, time_max=None, max_results=10):
         """
         Obtiene la información de citas agendadas filtradas por usuario, servicio y tiempo.
 
+        La búsqueda del usuario y el servicio se hace en Google Calendar (`q`) y se piden
+        solo los campos necesarios; las páginas se recorren hasta reunir `max_results` citas.
+        Con espejo local la misma búsqueda se resuelve en sus índices, sin llamar a la API.
+
+        Con `future_only` o con `time_min` se devuelven las primeras citas desde ese momento.
+        Sin ninguno de los dos se buscan las de los últimos `DIAS_HISTORIAL_CITAS` días y se
+        devuelven las más recientes. Si había más citas que `max_results`, el resultado
+        lo indica con 'truncated'.
+
         Args:
             user_name (str): Nombre del usuario para filtrar las citas.
             service (str): Nombre del servicio para filtrar las citas.
             future_only (bool): Indica si solo se deben devolver citas futuras.
+            time_min (str, optional): Inicio de la ventana de búsqueda (ISO 8601). Con `future_only`
+                se usa el momento actual si no se indica.
+            time_max (str, optional): Fin de la ventana de búsqueda (ISO 8601).
+            max_results (int): Número máximo de citas a devolver.
 
         Returns:
-            dict: Lista de citas filtradas o mensaje de error.
+            dict: Lista de citas filtradas (y 'truncated') o mensaje de error.
         """
         try:
             # Definir los rangos de tiempo para la búsqueda
-            now = datetime.now(timezone.utc).isoformat()  # Tiempo actual en formato ISO 8601
-            
-            print("OBTENEMOS CITAS DEL USUARIO")
-            
-            # Obtener todas las citas desde Google Calendar
-            events_result = self.service.events().list(
-                calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',
-                timeMin=now if future_only else None,
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
-
-            if not events:
-                return {
-                    "message": "No se encontraron citas agendadas.",
-                    "data": []
-                }
+            recientes = not future_only and not time_min
+            if future_only and not time_min:
+                time_min = datetime.now(timezone.utc).isoformat()  # Tiempo actual en formato ISO 8601
+            elif recientes:
+                # La API solo ordena de forma ascendente: se acota la ventana y se conservan las últimas
+                time_min = (datetime.now(timezone.utc) - timedelta(days=DIAS_HISTORIAL_CITAS)).isoformat()
+
+            # Google busca los términos; el filtro exacto sobre el título se aplica abajo
+            query = " ".join(term for term in (user_name, service) if term) or None
+            if self._usar_espejo():
+                events = self.mirror.find(text=[user_name, service], time_min=time_min, time_max=time_max)
+            else:
+                events = self.iter_events(
+                    time_min=time_min,
+                    time_max=time_max,
+                    q=query,
+                    page_size=max(2 * max_results, 25),
+                )
 
             # Filtrar eventos basados en 'user_name' y 'service'
-            filtered_events = []
+            coincidencias = deque(maxlen=max_results) if recientes else []
+            truncated = False
             for event in events:
                 summary = event.get('summary', '')
-                description = event.get('description', '')
-                start_time = event['start'].get('dateTime', event['start'].get('date'))
-                end_time = event['end'].get('dateTime', event['end'].get('date'))
-
-                # Aplicar filtros de usuario y servicio
-                if user_name.lower() in summary.lower() and service.lower() in summary.lower():
-                    filtered_events.append({
-                        "appointment_id": event.get('id'),
-                        "user_name": user_name,
-                        "service": service,
-                        "start_time": start_time,
-                        "end_time": end_time,
-                        "description": description,
-                        "summary": summary,
-                        "location": event.get('location', 'No se proporcionó una ubicación')
-                    })
+                if (user_name or '').lower() not in summary.lower() or (service or '').lower() not in summary.lower():
+                    continue
+                if len(coincidencias) >= max_results:
+                    truncated = True
+                    if not recientes:
+                        break
+                coincidencias.append(event)
+
+            filtered_events = []
+            for event in coincidencias:
+                filtered_events.append({
+                    "appointment_id": event.get('id'),
+                    "user_name": user_name,
+                    "service": service,
+                    "start_time": event['start'].get('dateTime', event['start'].get('date')),
+                    "end_time": event['end'].get('dateTime', event['end'].get('date')),
+                    "description": event.get('description', ''),
+                    "summary": event.get('summary', ''),
+                    "location": event.get('location', 'No se proporcionó una ubicación')
+                })
             
-            print(filtered_events)
+            logger.debug("Citas filtradas", extra={"ctx": {"count": len(filtered_events), "truncated": truncated}})
 
             if not filtered_events:
                 return {
@@ -337,20 +706,29 @@ class GoogleCalendarManager:
                     "data": []
                 }
 
+            if truncated:
+                cuales = "más recientes" if recientes else "primeras"
+                return {
+                    "message": f"Hay más citas que coinciden; se muestran solo las {len(filtered_events)} {cuales}.",
+                    "data": filtered_events,
+                    "truncated": True
+                }
+
             return {
                 "message": "La operación se completó exitosamente.",
-                "data": filtered_events
+                "data": filtered_events,
+                "truncated": False
             }
 
         except HttpError as error:
-            print(f"Error al obtener las citas: {error}")
+            logger.error("Error al obtener las citas", extra={"ctx": {"error": str(error)}})
             return {
                 "message": "Ocurrió un error al obtener las citas desde Google Calendar.",
                 "error": str(error)
             }
 
         except Exception as e:
-            print(f"Error inesperado: {str(e)}")
+            logger.exception("Error inesperado al obtener las citas")
             return {
                 "message": "Error inesperado al procesar la operación.",
                 "error": str(e)
@@ -371,23 +749,28 @@ class GoogleCalendarManager:
         try:
             # Convertir la fecha y hora de la cita a objeto datetime
             appointment_time = datetime.fromisoformat(appointment_datetime)
+            if appointment_time.tzinfo is None:
+                # Sin zona horaria la cita está en la hora del negocio (con o sin espejo)
+                appointment_time = appointment_time.replace(tzinfo=ZoneInfo(ZONA_HORARIA))
 
             # Definir rangos de tiempo precisos con zona horaria explícita
             time_min = (appointment_time - timedelta(minutes=1)).isoformat()
             time_max = (appointment_time + timedelta(minutes=1)).isoformat()
 
-            # Obtener los eventos en el rango de tiempo
-            events_result = self.service.events().list(
-                calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',
-                timeMin=f"{time_min}Z",  # Asegura el formato ISO 8601 UTC
-                timeMax=f"{time_max}Z",
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
-
-            events = events_result.get('items', [])
-            
-            print(events)
+            # Obtener los eventos en el rango de tiempo; el filtro por nombre se aplica
+            # abajo igual para ambos orígenes
+            if self._usar_espejo():
+                events = self.mirror.find(time_min=time_min, time_max=time_max)
+            else:
+                events_result = self._execute(self.service.events().list(
+                    calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',
+                    timeMin=time_min,
+                    timeMax=time_max,
+                    singleEvents=True,
+                    orderBy='startTime'
+                ), "events.list")
+
+                events = events_result.get('items', [])
 
             # Filtrar el evento por el nombre del usuario
             event_to_delete = None
@@ -398,9 +781,6 @@ class GoogleCalendarManager:
                 if user_name.lower() in summary.lower() and start_time.startswith(appointment_datetime):
                     event_to_delete = event
                     break
-            
-            print("EVENTO A BORRAR")
-            print(event_to_delete)
 
             # Si no se encuentra el evento
             if not event_to_delete:
@@ -410,13 +790,14 @@ class GoogleCalendarManager:
                 }
 
             # Eliminar el evento encontrado
-            self.service.events().delete(
+            self._execute(self.service.events().delete(
                 calendarId='c_5429309c7c93803f3c31f144ef187db179ada2d6ad3d527aba230d3293704913@group.calendar.google.com',
                 eventId=event_to_delete['id']
-            ).execute()
+            ), "events.delete")
+            self._descartar_evento(event_to_delete['id'])
 
             # Opcional: Log de la razón de cancelación
-            print(f"Cita cancelada. Razón: {reason}" if reason else "Cita cancelada sin razón especificada.")
+            logger.info("Cita cancelada", extra={"ctx": {"event_id": event_to_delete['id'], "reason": reason or "No especificada"}})
 
             # Devolver respuesta estandarizada
             return {
@@ -432,15 +813,37 @@ class GoogleCalendarManager:
             }
 
         except HttpError as error:
-            print(f"Error al cancelar la cita: {error}")
+            logger.error("Error al cancelar la cita", extra={"ctx": {"error": str(error)}})
             return {
                 "message": "Ocurrió un error al cancelar la cita.",
                 "error": str(error)
             }
 
         except Exception as e:
-            print(f"Error inesperado: {str(e)}")
+            logger.exception("Error inesperado al cancelar la cita")
             return {
                 "message": "Error inesperado al procesar la operación.",
                 "error": str(e)
             }
+
+
+def _estado(exception):
+    # Código HTTP de un error de la API, o None si no vino de una respuesta
+    resp = getattr(exception, "resp", None)
+    return getattr(resp, "status", None)
+
+
+def _reintentable(exception):
+    """
+    Indica si vale la pena reintentar una operación fallida.
+
+    Son temporales los errores del servidor, el 429 y el 403 por límite de uso; los
+    errores sin respuesta HTTP (conexión) también se reintentan.
+    """
+    status = _estado(exception)
+    if status is None:
+        return isinstance(exception, (OSError, httplib2.HttpLib2Error))
+    if status == 403:
+        content = getattr(exception, "content", b"") or b""
+        return b"rateLimitExceeded" in content or b"userRateLimitExceeded" in content
+    return status in ESTADOS_REINTENTABLES
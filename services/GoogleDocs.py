@@ -2,10 +2,14 @@ import json
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import os
 
+from services.GoogleServiceFactory import get_service
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
 SCOPES = ['https://www.googleapis.com/auth/documents']  # Acceso para trabajar con Google Docs
 
 
@@ -40,7 +44,7 @@ class GoogleDocsManager:
             with open('token_docs.json', 'w') as token:
                 token.write(creds.to_json())
 
-        return build('docs', 'v1', credentials=creds)
+        return get_service('docs', 'v1', creds)
 
     def get_document(self, document_id):
         """
@@ -54,8 +58,6 @@ class GoogleDocsManager:
             title = document.get('title')
             body = document.get('body', {}).get('content', [])
 
-            print(f"Título del documento: {title}")
-            print("Contenido del documento:")
 
             text = ""
             for element in body:
@@ -64,10 +66,10 @@ class GoogleDocsManager:
                     for text_run in paragraph.get('elements', []):
                         text += text_run.get('textRun', {}).get('content', '')
 
-            print(text)
+            logger.debug("Documento obtenido", extra={"ctx": {"document_id": document_id, "title": title, "length": len(text)}})
             return document
         except HttpError as error:
-            print(f"Ocurrió un error al obtener el documento: {error}")
+            logger.error("Error al obtener el documento", extra={"ctx": {"document_id": document_id, "error": str(error)}})
             return None
 
     def create_document(self, title, content):
@@ -95,8 +97,8 @@ class GoogleDocsManager:
                 documentId=document_id, body={'requests': requests}
             ).execute()
 
-            print(f"Documento creado con éxito. ID: {document_id}")
+            logger.info("Documento creado", extra={"ctx": {"document_id": document_id}})
             return document_id
         except HttpError as error:
-            print(f"Ocurrió un error al crear el documento: {error}")
+            logger.error("Error al crear el documento", extra={"ctx": {"error": str(error)}})
             return None
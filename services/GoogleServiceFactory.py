@@ -0,0 +1,79 @@
+import os
+import threading
+from collections import OrderedDict
+
+import google_auth_httplib2
+import httplib2
+from googleapiclient.discovery import build
+from googleapiclient.http import HttpRequest
+
+# Tiempo límite (segundos) de las conexiones a las APIs de Google
+HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "30"))
+
+# Número máximo de clientes distintos (API, versión, credenciales) que se conservan
+MAX_SERVICES = 16
+
+_services = OrderedDict()
+_lock = threading.Lock()
+_pid = None
+
+
+def get_service(api, version, credentials):
+    """
+    Devuelve el cliente de una API de Google, construido una sola vez por proceso.
+
+    El cliente se arma con el documento de descubrimiento incluido en la librería
+    (`static_discovery=True`), sin descargarlo ni volver a interpretarlo en cada uso.
+    Puede compartirse entre hilos: cada hilo ejecuta sus solicitudes con su propia
+    conexión autorizada (httplib2 no es seguro entre hilos) y la reutiliza después.
+
+    Args:
+        api (str): Nombre de la API (por ejemplo, 'calendar').
+        version (str): Versión de la API (por ejemplo, 'v3').
+        credentials (google.auth.credentials.Credentials): Credenciales a usar.
+
+    Returns:
+        googleapiclient.discovery.Resource: Cliente de la API.
+    """
+    global _pid
+    key = (api, version, id(credentials))
+    with _lock:
+        # Las conexiones no sobreviven a un fork; cada worker arma las suyas
+        if _pid != os.getpid():
+            _services.clear()
+            _pid = os.getpid()
+
+        entry = _services.get(key)
+        if entry is not None and entry[0] is credentials:
+            _services.move_to_end(key)
+            return entry[1]
+
+        service = _build(api, version, credentials)
+        _services[key] = (credentials, service)
+        while len(_services) > MAX_SERVICES:
+            _services.popitem(last=False)
+        return service
+
+
+def _build(api, version, credentials):
+    local = threading.local()
+
+    def authorized_http():
+        http = getattr(local, "http", None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT))
+            local.http = http
+        return http
+
+    def request_builder(http, *args, **kwargs):
+        # Se ignora la conexión del hilo que construyó el cliente y se usa la del hilo actual
+        return HttpRequest(authorized_http(), *args, **kwargs)
+
+    return build(
+        api,
+        version,
+        http=authorized_http(),
+        requestBuilder=request_builder,
+        static_discovery=True,
+        cache_discovery=False,
+    )
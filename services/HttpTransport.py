@@ -0,0 +1,82 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Tiempos límite por defecto (conexión, lectura) en segundos
+TIMEOUT = (float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05")), float(os.getenv("HTTP_READ_TIMEOUT", "30")))
+
+# Conexiones keep-alive que se conservan por host
+POOL_SIZES = {
+    "https://api.airtable.com/": int(os.getenv("AIRTABLE_POOL_SIZE", "10")),
+    "https://graph.facebook.com/": int(os.getenv("WHATSAPP_POOL_SIZE", "10")),
+}
+DEFAULT_POOL_SIZE = 4
+
+_local = {"session": None, "pid": None}
+_lock = threading.Lock()
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    def __init__(self, *args, timeout=TIMEOUT, **kwargs):
+        """
+        HTTPAdapter que aplica un tiempo límite por defecto a cada solicitud.
+
+        Args:
+            timeout (tuple): Tiempo límite (conexión, lectura) si la solicitud no indica uno.
+        """
+        self.timeout = timeout
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def _retry_policy():
+    # Los errores de conexión se reintentan siempre (la solicitud no llegó a enviarse);
+    # los de lectura solo en métodos idempotentes. Los códigos HTTP los maneja cada gestor.
+    return Retry(
+        total=3,
+        connect=3,
+        read=2,
+        status=0,
+        backoff_factor=0.3,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+
+
+def _build_session():
+    session = requests.Session()
+    for prefix, pool_size in POOL_SIZES.items():
+        session.mount(prefix, TimeoutHTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=_retry_policy(),
+        ))
+    session.mount("https://", TimeoutHTTPAdapter(
+        pool_connections=DEFAULT_POOL_SIZE, pool_maxsize=DEFAULT_POOL_SIZE, max_retries=_retry_policy(),
+    ))
+    return session
+
+
+def get_session():
+    """
+    Devuelve la sesión HTTP compartida del proceso.
+
+    La sesión mantiene conexiones keep-alive por host (con compresión gzip, tiempos
+    límite y reintentos de conexión), de modo que las llamadas repetidas a Airtable y
+    WhatsApp no repiten el handshake TCP/TLS. Se crea de nuevo en cada worker tras el fork.
+
+    Returns:
+        requests.Session: Sesión compartida.
+    """
+    if _local["pid"] == os.getpid():
+        return _local["session"]
+    with _lock:
+        if _local["pid"] != os.getpid():
+            _local["session"] = _build_session()
+            _local["pid"] = os.getpid()
+    return _local["session"]
@@ -0,0 +1,173 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import time
+
+# Campos del cliente que nunca se escriben completos en los logs
+CAMPOS_SENSIBLES = {
+    "nombre_completo", "telefono_movil", "correo_electronico", "domicilio", "fecha_nacimiento",
+    "edad", "sexo", "phone_number", "name", "text", "message", "content", "to",
+    "Nombre", "Teléfono", "Correo", "Nombre Completo", "Teléfono Móvil", "Correo electrónico",
+    "Domicilio", "Fecha de Nacimiento",
+}
+
+PATRON_CORREO = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PATRON_TELEFONO = re.compile(r"\+?\d[\d\s-]{8,}\d")
+
+# Atributos estándar de LogRecord que no forman parte del contexto estructurado
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "ctx"}
+
+_listener = None
+
+
+def redactar(valor):
+    """
+    Enmascara datos personales dentro de un valor (dict, lista o texto).
+
+    Args:
+        valor (object): Valor a enmascarar.
+
+    Returns:
+        object: Copia del valor con los datos sensibles enmascarados.
+    """
+    if isinstance(valor, dict):
+        return {
+            key: _mascara(item) if key in CAMPOS_SENSIBLES and item else redactar(item)
+            for key, item in valor.items()
+        }
+    if isinstance(valor, (list, tuple)):
+        return [redactar(item) for item in valor]
+    if isinstance(valor, str):
+        return PATRON_TELEFONO.sub(lambda m: _mascara(m.group()), PATRON_CORREO.sub("***@***", valor))
+    return valor
+
+
+def _mascara(valor):
+    texto = str(valor)
+    if len(texto) <= 4:
+        return "***"
+    return f"***{texto[-4:]}"
+
+
+class RedactionFilter(logging.Filter):
+    """Enmascara datos personales en el mensaje y en el contexto del registro."""
+
+    def filter(self, record):
+        record.msg = redactar(record.getMessage())
+        record.args = ()
+        if hasattr(record, "ctx"):
+            record.ctx = redactar(record.ctx)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate):
+        """
+        Deja pasar solo una fracción de los registros DEBUG/INFO; WARNING o superior siempre pasa.
+
+        Args:
+            rate (float): Fracción (0 a 1) de registros DEBUG/INFO que se conservan.
+        """
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON."""
+
+    def format(self, record):
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if hasattr(record, "ctx"):
+            data.update(record.ctx)
+        for key, value in vars(record).items():
+            if key not in _ATRIBUTOS_RECORD and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta registros si la cola está llena en lugar de bloquear."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+def configurar_logging(level=None, sample_rate=None, max_queue=10000, stream=None):
+    """
+    Configura el logging de la aplicación: filtros de redacción y muestreo, una cola
+    en memoria y un hilo de fondo que escribe líneas JSON en stdout.
+
+    Args:
+        level (str, optional): Nivel mínimo. Por defecto la variable LOG_LEVEL o INFO.
+        sample_rate (float, optional): Fracción de registros DEBUG/INFO a conservar. Por defecto LOG_SAMPLE_RATE o 1.
+        max_queue (int): Tamaño máximo de la cola; los registros excedentes se descartan.
+        stream (file, optional): Destino de los registros. Por defecto stdout.
+    """
+    global _listener
+
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    sample_rate = float(sample_rate if sample_rate is not None else os.getenv("LOG_SAMPLE_RATE", "1"))
+
+    log_queue = queue.Queue(maxsize=max_queue)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(SamplingFilter(sample_rate))
+    handler.addFilter(RedactionFilter())
+
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if isinstance(existing, NonBlockingQueueHandler):
+            root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    if _listener is not None:
+        _listener.stop()
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=False)
+    _listener.start()
+
+    # El hilo escritor no sobrevive a un fork (gunicorn --preload); se reinicia en el hijo
+    if hasattr(os, "register_at_fork") and not getattr(configurar_logging, "_fork_hook", False):
+        os.register_at_fork(after_in_child=_reiniciar_listener)
+        configurar_logging._fork_hook = True
+
+
+def _reiniciar_listener():
+    if _listener is not None:
+        _listener._thread = None
+        _listener.start()
+
+
+def get_logger(name):
+    """
+    Devuelve un logger de la aplicación.
+
+    Args:
+        name (str): Nombre del módulo.
+
+    Returns:
+        logging.Logger: Logger configurado por `configurar_logging`.
+    """
+    return logging.getLogger(name)
@@ -0,0 +1,263 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import ContextDecorator
+
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+# Límites (segundos) de los buckets del histograma
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_NAME = "bellachik_stage_duration_seconds"
+
+# Archivo de cada proceso: metrics_<pid>_<token>.json (el token distingue PIDs reutilizados)
+_ARCHIVO_PROCESO = re.compile(r"metrics_(\d+)(?:_(\w+))?\.json$")
+
+# Series acumuladas de los procesos que ya terminaron
+ARCHIVO_HISTORICO = "metrics_archived.json"
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, registry, labels):
+        self.registry = registry
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # Un medidor nuevo por llamada cuando se usa como decorador (seguro entre hilos)
+        return _Timer(self.registry, self.labels)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = dict(self.labels, outcome="error" if exc_type else "ok")
+        self.registry.observe(time.perf_counter() - self.start, **labels)
+        return False
+
+
+class MetricsRegistry:
+    def __init__(self, directory, flush_interval=5.0, buckets=BUCKETS):
+        """
+        Histogramas de latencia por etapa, agregados entre los workers de gunicorn.
+
+        Cada proceso acumula sus observaciones en memoria y las escribe periódicamente
+        en un archivo propio dentro de `directory`; `render()` suma los archivos de todos
+        los procesos y devuelve el resultado en formato de texto de Prometheus.
+
+        Los archivos de procesos que ya terminaron se suman a un archivo histórico y se
+        eliminan (al iniciar cada worker y en `render()`), de modo que los contadores no
+        retroceden ni crecen los archivos sin límite.
+
+        Args:
+            directory (str): Directorio compartido para los archivos de cada proceso.
+            flush_interval (float): Segundos entre escrituras del archivo del proceso.
+            buckets (tuple): Límites superiores de los buckets del histograma.
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._pid = None
+        self._token = None
+
+    def time(self, stage, **labels):
+        """
+        Mide la duración de un bloque (`with`) o de una función (decorador).
+
+        Args:
+            stage (str): Etapa medida (openai, tool, airtable, calendar, whatsapp, gmail...).
+            **labels: Etiquetas adicionales, por ejemplo `operation="list_records"`.
+
+        Returns:
+            ContextDecorator: Medidor de tiempo.
+        """
+        return _Timer(self, dict(labels, stage=stage))
+
+    def observe(self, seconds, **labels):
+        """
+        Registra una observación en el histograma.
+
+        Args:
+            seconds (float): Duración observada.
+            **labels: Etiquetas de la serie.
+        """
+        key = tuple(sorted((name, str(value)) for name, value in labels.items()))
+        with self._lock:
+            self._ensure_flusher()
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += seconds
+            series["count"] += 1
+            self._dirty = True
+
+    def flush(self):
+        """Escribe las series del proceso actual en su archivo."""
+        with self._lock:
+            if not self._dirty:
+                return
+            snapshot = [
+                {"labels": dict(key), "buckets": list(series["buckets"]), "sum": series["sum"], "count": series["count"]}
+                for key, series in self._series.items()
+            ]
+            self._dirty = False
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"metrics_{os.getpid()}_{self._token}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"buckets": self.buckets, "series": snapshot}, f)
+        os.replace(tmp_path, path)
+
+    def render(self):
+        """
+        Agrega las series de todos los procesos.
+
+        Returns:
+            str: Métricas en formato de texto de Prometheus.
+        """
+        self.flush()
+        self.archive_dead()
+        totals = {}
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+            self._sumar(totals, _leer(path))
+
+        lines = [
+            f"# HELP {METRIC_NAME} Duración de las llamadas externas y etapas de cada turno.",
+            f"# TYPE {METRIC_NAME} histogram",
+        ]
+        for key in sorted(totals):
+            total = totals[key]
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in key)
+            for bound, count in zip(self.buckets, total["buckets"]):
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{METRIC_NAME}_bucket{{{labels},le="+Inf"}} {total["count"]}')
+            lines.append(f"{METRIC_NAME}_sum{{{labels}}} {total['sum']}")
+            lines.append(f"{METRIC_NAME}_count{{{labels}}} {total['count']}")
+        return "\n".join(lines) + "\n"
+
+    def _sumar(self, totals, data):
+        if not data or tuple(data.get("buckets", ())) != self.buckets:
+            return
+        for series in data["series"]:
+            key = tuple(sorted(series["labels"].items()))
+            total = totals.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], series["buckets"])]
+            total["sum"] += series["sum"]
+            total["count"] += series["count"]
+
+    def archive_dead(self):
+        """Suma al archivo histórico los archivos de procesos que ya terminaron y los elimina."""
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+            match = _ARCHIVO_PROCESO.search(os.path.basename(path))
+            if not match:
+                continue
+            pid, token = int(match.group(1)), match.group(2)
+            if pid == os.getpid():
+                # Un archivo con el PID actual y otro token es de un proceso anterior con el mismo PID
+                if token == self._token:
+                    continue
+            elif _vivo(pid):
+                continue
+            self._archivar(path)
+
+    def _archivar(self, path):
+        claimed = f"{path}.dead"
+        try:
+            # Solo un proceso logra reclamar cada archivo
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return
+        archive_path = os.path.join(self.directory, ARCHIVO_HISTORICO)
+        with open(os.path.join(self.directory, "metrics_archived.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            totals = {}
+            self._sumar(totals, _leer(archive_path))
+            self._sumar(totals, _leer(claimed))
+            snapshot = [
+                {"labels": dict(key), "buckets": total["buckets"], "sum": total["sum"], "count": total["count"]}
+                for key, total in totals.items()
+            ]
+            tmp_path = f"{archive_path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"buckets": self.buckets, "series": snapshot}, f)
+            os.replace(tmp_path, archive_path)
+        os.remove(claimed)
+
+    def _ensure_flusher(self):
+        # Se inicia en cada worker después del fork
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            # Proceso hijo: las series heredadas pertenecen al padre
+            self._series = {}
+        self._pid = os.getpid()
+        self._token = uuid.uuid4().hex[:8]
+        try:
+            self.archive_dead()
+        except Exception as e:
+            logger.warning("Error al archivar métricas de procesos terminados", extra={"ctx": {"error": str(e)}})
+        threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Error al escribir métricas", extra={"ctx": {"error": str(e)}})
+
+
+def _leer(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+metrics = MetricsRegistry(os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "bellachik_metrics")))
+
+
+def medir(stage, **labels):
+    """
+    Atajo para `metrics.time(...)`.
+
+    Args:
+        stage (str): Etapa medida.
+        **labels: Etiquetas adicionales.
+
+    Returns:
+        ContextDecorator: Medidor de tiempo.
+    """
+    return metrics.time(stage, **labels)
@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, path, rate=5.0, capacity=1.0, max_wait=30.0):
+        """
+        Token bucket compartido entre procesos (SQLite en modo WAL).
+
+        Todos los workers que usan el mismo archivo consumen del mismo bucket por llave,
+        por lo que el límite se respeta a nivel de servidor y no por proceso.
+
+        Args:
+            path (str): Ruta del archivo SQLite.
+            rate (float): Tokens (solicitudes) que se reponen por segundo.
+            capacity (float): Ráfaga máxima. Con 1 las solicitudes se espacian de forma
+                uniforme y nunca hay más de `rate` en una ventana de un segundo.
+            max_wait (float): Espera máxima (segundos) por un token antes de rendirse.
+        """
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        self._connect().execute(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+    def _take(self, key):
+        # Devuelve 0 si se obtuvo un token, o los segundos hasta que haya uno disponible
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + (now - row[1]) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, key, timeout=None):
+        """
+        Espera hasta obtener un token del bucket.
+
+        Args:
+            key (str): Llave del bucket (por ejemplo, el ID de la base de Airtable).
+            timeout (float, optional): Espera máxima en segundos. Por defecto `max_wait`.
+
+        Returns:
+            bool: True si se obtuvo el token, False si se agotó la espera.
+        """
+        deadline = time.monotonic() + (self.max_wait if timeout is None else timeout)
+        while True:
+            wait = self._take(key)
+            if wait == 0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def penalize(self, key, seconds):
+        """
+        Bloquea el bucket durante unos segundos para todos los procesos (por ejemplo, tras un 429).
+
+        Args:
+            key (str): Llave del bucket.
+            seconds (float): Segundos durante los cuales no se entregan tokens.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = -seconds * self.rate
+            if row is not None:
+                tokens = min(tokens, row[0] + (now - row[1]) * self.rate)
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
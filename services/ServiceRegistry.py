@@ -0,0 +1,111 @@
+import threading
+
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ServiceRegistry:
+    def __init__(self, refresh_interval=300):
+        """
+        Registro de gestores de servicios compartidos por todo el proceso.
+
+        Cada gestor se construye de forma perezosa la primera vez que se solicita
+        y se reutiliza en las solicitudes siguientes. Cada nombre tiene su propio candado
+        de construcción: un gestor lento no bloquea a los demás y una fábrica puede pedir
+        otros gestores al registro. Los gestores que exponen
+        `refresh_credentials()` se renuevan periódicamente en un hilo de fondo.
+
+        Args:
+            refresh_interval (float): Segundos entre cada ronda de renovación de credenciales.
+        """
+        self.refresh_interval = refresh_interval
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self._refresher = None
+        self._stop = threading.Event()
+
+    def register(self, name, factory):
+        """
+        Registra la función que construye un gestor.
+
+        Args:
+            name (str): Nombre con el que se solicitará el gestor.
+            factory (callable): Función sin argumentos que devuelve la instancia.
+        """
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name):
+        """
+        Devuelve la instancia compartida del gestor, construyéndola si es necesario.
+
+        Args:
+            name (str): Nombre del gestor registrado.
+
+        Returns:
+            object: Instancia del gestor.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Servicio no registrado: {name}")
+            build_lock = self._build_locks.setdefault(name, threading.Lock())
+
+        # La fábrica corre fuera del candado del registro
+        with build_lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                factory = self._factories[name]
+                instance = factory()
+                self._warm(instance)
+                with self._lock:
+                    # Si se registró otra fábrica mientras tanto, esta instancia ya no aplica
+                    if self._factories.get(name) is factory:
+                        self._instances[name] = instance
+                    self._start_refresher()
+        return instance
+
+    def reset(self, name=None):
+        """
+        Descarta la instancia de un gestor (o de todos) para que se reconstruya en el siguiente uso.
+
+        Args:
+            name (str, optional): Nombre del gestor. Si se omite se descartan todos.
+        """
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(name, None)
+
+    def shutdown(self):
+        """Detiene el hilo de renovación de credenciales."""
+        self._stop.set()
+
+    def _warm(self, instance):
+        refresh = getattr(instance, "refresh_credentials", None)
+        if refresh is None:
+            return
+        try:
+            refresh()
+        except Exception as e:
+            logger.warning("No se pudieron renovar las credenciales", extra={"ctx": {"service": type(instance).__name__, "error": str(e)}})
+
+    def _start_refresher(self):
+        # Se inicia tras el fork de cada worker, en la primera construcción
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name="service-refresher", daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            for instance in list(self._instances.values()):
+                self._warm(instance)
@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from services.ClientCache import normalizar_telefono
+
+
+class ThreadIndex:
+    def __init__(self, path, cache_size=4096):
+        """
+        Índice persistente (SQLite en modo WAL) de hilos de conversación.
+
+        Relaciona teléfonos e IDs de cliente de Airtable con el ID del hilo de OpenAI y
+        guarda el cursor del último mensaje visto por hilo. Un LRU en memoria atiende las
+        búsquedas repetidas de hilos; el archivo se comparte de forma segura entre workers de gunicorn.
+        Los teléfonos se guardan y se buscan solo con sus dígitos, de modo que un mismo
+        cliente escrito en formatos distintos conserva su hilo.
+
+        Args:
+            path (str): Ruta del archivo SQLite.
+            cache_size (int): Número máximo de entradas en el LRU en memoria.
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS threads (
+                thread_id TEXT PRIMARY KEY,
+                last_message_id TEXT,
+                last_run_id TEXT,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS thread_keys (
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                thread_id TEXT NOT NULL,
+                PRIMARY KEY (kind, value)
+            )
+            """
+        )
+
+    def _cache_get(self, key):
+        with self._cache_lock:
+            if key not in self._cache:
+                return None
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+    def _cache_put(self, key, value):
+        with self._cache_lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _llaves(self, phone_number, client_id):
+        keys = (("phone", normalizar_telefono(phone_number)), ("client", client_id))
+        return [(kind, value) for kind, value in keys if value]
+
+    def get_thread(self, phone_number=None, client_id=None):
+        """
+        Busca el hilo asociado a un teléfono o a un ID de cliente.
+
+        Args:
+            phone_number (str, optional): Teléfono del cliente.
+            client_id (str, optional): ID del registro del cliente en Airtable.
+
+        Returns:
+            str | None: ID del hilo o None si no existe.
+        """
+        for kind, value in self._llaves(phone_number, client_id):
+            thread_id = self._cache_get((kind, value))
+            if thread_id is None:
+                row = self._connect().execute(
+                    "SELECT thread_id FROM thread_keys WHERE kind = ? AND value = ?",
+                    (kind, value),
+                ).fetchone()
+                if row:
+                    thread_id = row[0]
+                    self._cache_put((kind, value), thread_id)
+            if thread_id:
+                return thread_id
+        return None
+
+    def link(self, thread_id, phone_number=None, client_id=None):
+        """
+        Asocia un hilo a un teléfono y/o ID de cliente. Si la llave ya tenía un hilo se conserva el existente.
+
+        Args:
+            thread_id (str): ID del hilo.
+            phone_number (str, optional): Teléfono del cliente.
+            client_id (str, optional): ID del registro del cliente en Airtable.
+
+        Returns:
+            str: ID del hilo asociado (el existente si la llave ya estaba registrada).
+        """
+        keys = self._llaves(phone_number, client_id)
+        if keys and all(self._cache_get(key) == thread_id for key in keys):
+            return thread_id
+
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR IGNORE INTO threads (thread_id, updated_at) VALUES (?, ?)",
+            (thread_id, time.time()),
+        )
+        linked = thread_id
+        for kind, value in keys:
+            conn.execute(
+                "INSERT OR IGNORE INTO thread_keys (kind, value, thread_id) VALUES (?, ?, ?)",
+                (kind, value, thread_id),
+            )
+            stored = conn.execute(
+                "SELECT thread_id FROM thread_keys WHERE kind = ? AND value = ?",
+                (kind, value),
+            ).fetchone()[0]
+            self._cache_put((kind, value), stored)
+            if kind == "phone" or keys[0][0] != "phone":
+                linked = stored
+        return linked
+
+    def get_cursor(self, thread_id):
+        """
+        Devuelve el cursor del hilo.
+
+        Se lee siempre del archivo (sin LRU) porque otro worker pudo haberlo avanzado.
+
+        Args:
+            thread_id (str): ID del hilo.
+
+        Returns:
+            dict | None: {'last_message_id', 'last_run_id'} o None si no hay cursor.
+        """
+        row = self._connect().execute(
+            "SELECT last_message_id, last_run_id FROM threads WHERE thread_id = ?",
+            (thread_id,),
+        ).fetchone()
+        if not row or not row[0]:
+            return None
+        return {"last_message_id": row[0], "last_run_id": row[1]}
+
+    def set_cursor(self, thread_id, last_message_id, last_run_id):
+        """
+        Guarda el último mensaje visto y el último run ejecutado en el hilo.
+
+        Args:
+            thread_id (str): ID del hilo.
+            last_message_id (str): ID del último mensaje visto.
+            last_run_id (str): ID del último run ejecutado.
+        """
+        self._connect().execute(
+            """
+            INSERT INTO threads (thread_id, last_message_id, last_run_id, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (thread_id) DO UPDATE SET
+                last_message_id = excluded.last_message_id,
+                last_run_id = excluded.last_run_id,
+                updated_at = excluded.updated_at
+            """,
+            (thread_id, last_message_id, last_run_id, time.time()),
+        )
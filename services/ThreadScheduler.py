@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ThreadScheduler:
+    def __init__(self, handler, debounce=2.0, max_delay=10.0, max_workers=8):
+        """
+        Serializa el trabajo por hilo de conversación y agrupa ráfagas de mensajes.
+
+        Los elementos enviados con la misma llave se acumulan hasta que pasan `debounce`
+        segundos sin recibir otro (o `max_delay` desde el primero) y se procesan juntos
+        en una sola llamada a `handler`. Nunca se ejecutan dos lotes de la misma llave
+        a la vez: lo que llegue mientras un lote está en curso forma el siguiente lote.
+
+        Con `register` se agregan otros tipos de trabajo con su propio handler y tiempos.
+        Cada tipo forma sus propios lotes, pero la exclusión es por llave: los lotes de
+        distintos tipos con la misma llave tampoco se ejecutan a la vez.
+
+        Args:
+            handler (callable): Función `handler(key, items)` que procesa un lote.
+            debounce (float): Segundos de silencio tras los cuales se procesa el lote.
+            max_delay (float): Espera máxima (segundos) desde el primer elemento del lote.
+            max_workers (int): Número máximo de lotes procesándose a la vez (de llaves distintas).
+        """
+        self.handler = handler
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._kinds = {None: (handler, debounce, max_delay)}
+        self.max_workers = max_workers
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._running = set()
+        self._pool = None
+        self._pid = None
+
+    def register(self, kind, handler, debounce=None, max_delay=None):
+        """
+        Registra otro tipo de trabajo que comparte las llaves de serialización.
+
+        Args:
+            kind (str): Nombre del tipo de trabajo.
+            handler (callable): Función `handler(key, items)` que procesa un lote de este tipo.
+            debounce (float, optional): Segundos de silencio. Por defecto los del programador.
+            max_delay (float, optional): Espera máxima. Por defecto la del programador.
+        """
+        self._kinds[kind] = (
+            handler,
+            self.debounce if debounce is None else debounce,
+            self.max_delay if max_delay is None else max_delay,
+        )
+
+    def submit(self, key, item, kind=None):
+        """
+        Agrega un elemento al lote pendiente de la llave.
+
+        Args:
+            key (str): Llave de serialización (por ejemplo, el teléfono del cliente).
+            item (object): Elemento a procesar.
+            kind (str, optional): Tipo de trabajo registrado con `register`.
+
+        Returns:
+            Future: Se resuelve con el resultado de `handler` para el lote que incluyó el elemento.
+        """
+        future = Future()
+        with self._cond:
+            self._ensure_started()
+            now = time.monotonic()
+            batch = self._pending.setdefault((key, kind), {"items": [], "first": now})
+            batch["items"].append((item, future))
+            batch["last"] = now
+            self._cond.notify()
+        return future
+
+    def _ensure_started(self):
+        # Se inicia en cada worker después del fork
+        if self._pid == os.getpid():
+            return
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="thread-scheduler")
+        threading.Thread(target=self._dispatch_loop, name="thread-scheduler-dispatch", daemon=True).start()
+        self._pid = os.getpid()
+
+    def _due(self, kind, batch):
+        _, debounce, max_delay = self._kinds[kind]
+        return min(batch["last"] + debounce, batch["first"] + max_delay)
+
+    def _dispatch_loop(self):
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                timeout = None
+                for (key, kind), batch in list(self._pending.items()):
+                    if key in self._running:
+                        continue
+                    due = self._due(kind, batch)
+                    if due <= now:
+                        del self._pending[(key, kind)]
+                        self._running.add(key)
+                        self._pool.submit(self._run, key, kind, batch["items"])
+                    else:
+                        timeout = due - now if timeout is None else min(timeout, due - now)
+                self._cond.wait(timeout)
+
+    def _run(self, key, kind, items):
+        try:
+            if len(items) > 1:
+                logger.info("Se agrupan mensajes en un solo lote", extra={"ctx": {"key": key, "kind": kind, "items": len(items)}})
+            handler = self._kinds[kind][0]
+            result = handler(key, [item for item, _ in items])
+            for _, future in items:
+                future.set_result(result)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+        finally:
+            with self._cond:
+                self._running.discard(key)
+                self._cond.notify()
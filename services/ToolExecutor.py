@@ -0,0 +1,74 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from services.Metrics import medir
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ToolExecutor:
+    def __init__(self, max_workers=8, default_timeout=20.0, timeouts=None):
+        """
+        Ejecuta en paralelo las herramientas solicitadas por el asistente.
+
+        Args:
+            max_workers (int): Número máximo de herramientas ejecutándose a la vez.
+            default_timeout (float): Tiempo límite (segundos) para cada herramienta.
+            timeouts (dict, optional): Tiempos límite específicos por nombre de herramienta.
+        """
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def execute(self, tool_calls, function_map):
+        """
+        Ejecuta todas las herramientas de un `required_action` y reúne sus salidas.
+
+        Args:
+            tool_calls (list): Llamadas a herramientas del run.
+            function_map (dict): Mapeo de nombre de herramienta a función.
+
+        Returns:
+            list: Salidas en formato {'tool_call_id', 'output'}, en el mismo orden que `tool_calls`.
+        """
+        start = time.monotonic()
+        pending = []
+        for tool_call in tool_calls:
+            future = self._pool.submit(self._run_tool, tool_call, function_map)
+            deadline = start + self.timeouts.get(tool_call.function.name, self.default_timeout)
+            pending.append((tool_call, future, deadline))
+
+        tool_outputs = []
+        for tool_call, future, deadline in pending:
+            try:
+                output = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                tool_name = tool_call.function.name
+                logger.warning("La herramienta excedió el tiempo límite", extra={"ctx": {"tool": tool_name}})
+                output = {"error": f"Tool {tool_name} timed out"}
+            tool_outputs.append({
+                "tool_call_id": tool_call.id,
+                "output": json.dumps(output),
+            })
+        return tool_outputs
+
+    def _run_tool(self, tool_call, function_map):
+        tool_name = tool_call.function.name
+
+        if tool_name not in function_map:
+            logger.warning("Herramienta desconocida", extra={"ctx": {"tool": tool_name}})
+            return {"error": f"Tool {tool_name} not implemented"}
+
+        try:
+            tool_arguments = json.loads(tool_call.function.arguments or "{}")  # Parsear argumentos de la herramienta
+            logger.debug("Procesando herramienta", extra={"ctx": {"tool": tool_name, "arguments": tool_arguments}})
+            # Ejecutar la función con los argumentos descompuestos
+            with medir("tool", operation=tool_name):
+                result = function_map[tool_name](**tool_arguments)
+            logger.debug("Resultado de herramienta", extra={"ctx": {"tool": tool_name, "result": result}})
+            return result
+        except Exception as e:
+            logger.exception("Error al ejecutar herramienta", extra={"ctx": {"tool": tool_name}})
+            return {"error": str(e)}
@@ -0,0 +1,256 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class WebhookQueue:
+    def __init__(self, path, handler, workers=2, max_attempts=3, poll_interval=0.5,
+                 lease_seconds=300, retention_seconds=7 * 24 * 3600):
+        """
+        Cola local y durable (SQLite) para procesar en segundo plano los mensajes recibidos por webhook.
+
+        La base se comparte entre los workers de gunicorn: cada proceso levanta sus propios
+        hilos consumidores y reclama trabajos de forma atómica. El ID del mensaje de WhatsApp
+        es único, por lo que los reintentos de Meta no generan trabajos duplicados. Los
+        trabajos con la misma llave (por ejemplo, el teléfono) solo los reclama el proceso
+        que ya tiene uno de ellos en curso, para que puedan serializarse y agruparse.
+
+        Args:
+            path (str): Ruta del archivo SQLite.
+            handler (callable): Función que recibe el payload (dict) de cada trabajo. Si devuelve
+                un Future, el trabajo se completa cuando éste se resuelve.
+            workers (int): Número de hilos consumidores por proceso.
+            max_attempts (int): Intentos antes de marcar un trabajo como fallido.
+            poll_interval (float): Segundos entre consultas cuando la cola está vacía.
+            lease_seconds (float): Tiempo tras el cual un trabajo reclamado se considera abandonado.
+            retention_seconds (float): Tiempo que se conservan los trabajos terminados (para deduplicar).
+        """
+        self.path = path
+        self.handler = handler
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                message_id TEXT UNIQUE NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                locked_until REAL,
+                created_at REAL NOT NULL,
+                error TEXT,
+                thread_key TEXT,
+                owner INTEGER,
+                added_as TEXT
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, available_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_thread_key ON jobs (thread_key, status)")
+
+    def enqueue(self, message_id, payload, key=None):
+        """
+        Agrega un trabajo a la cola si su ID de mensaje no se ha recibido antes.
+
+        Args:
+            message_id (str): ID único del mensaje (wamid).
+            payload (dict): Datos necesarios para procesar el mensaje.
+            key (str, optional): Llave de afinidad; sus trabajos los atiende un solo proceso a la vez.
+
+        Returns:
+            bool: True si se encoló, False si era un duplicado.
+        """
+        now = time.time()
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO jobs (message_id, payload, available_at, created_at, thread_key) VALUES (?, ?, ?, ?, ?)",
+            (message_id, json.dumps(payload), now, now, key),
+        )
+        if cursor.rowcount:
+            self._wakeup.set()
+            return True
+        return False
+
+    def mark_added(self, message_ids, added_as):
+        """
+        Registra que el texto de estos trabajos ya se agregó al hilo de conversación, para
+        que un reintento no lo vuelva a agregar.
+
+        Args:
+            message_ids (list): IDs de los mensajes (wamid).
+            added_as (str): ID del mensaje del hilo que contiene su texto.
+        """
+        self._connect().executemany(
+            "UPDATE jobs SET added_as = ? WHERE message_id = ?",
+            [(added_as, message_id) for message_id in message_ids],
+        )
+
+    def added(self, message_ids):
+        """
+        Indica cuáles de estos trabajos ya tienen su texto agregado al hilo.
+
+        Args:
+            message_ids (list): IDs de los mensajes (wamid).
+
+        Returns:
+            set: IDs de los mensajes ya agregados.
+        """
+        message_ids = list(message_ids)
+        if not message_ids:
+            return set()
+        placeholders = ", ".join("?" * len(message_ids))
+        rows = self._connect().execute(
+            f"SELECT message_id FROM jobs WHERE added_as IS NOT NULL AND message_id IN ({placeholders})",
+            message_ids,
+        )
+        return {row[0] for row in rows}
+
+    def start(self):
+        """Inicia los hilos consumidores del proceso actual (idempotente y seguro tras un fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f"webhook-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+
+    def stats(self):
+        """
+        Devuelve el número de trabajos por estado.
+
+        Returns:
+            dict: Conteo de trabajos por estado.
+        """
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def _claim(self):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                """
+                SELECT id, payload, attempts FROM jobs AS j
+                WHERE ((j.status = 'pending' AND j.available_at <= ?)
+                       OR (j.status = 'running' AND j.locked_until < ?))
+                  AND (j.thread_key IS NULL OR NOT EXISTS (
+                        SELECT 1 FROM jobs AS r
+                        WHERE r.thread_key = j.thread_key AND r.status = 'running'
+                          AND r.owner != ? AND r.locked_until >= ?))
+                ORDER BY j.id LIMIT 1
+                """,
+                (now, now, os.getpid(), now),
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, locked_until = ?, owner = ? WHERE id = ?",
+                    (now + self.lease_seconds, os.getpid(), row[0]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _complete(self, job_id):
+        self._connect().execute(
+            "UPDATE jobs SET status = 'done', locked_until = NULL, error = NULL WHERE id = ?",
+            (job_id,),
+        )
+
+    def _fail(self, job_id, attempts, error):
+        if attempts >= self.max_attempts:
+            self._connect().execute(
+                "UPDATE jobs SET status = 'failed', locked_until = NULL, error = ? WHERE id = ?",
+                (error, job_id),
+            )
+            return
+        # Reintento con espera exponencial
+        self._connect().execute(
+            "UPDATE jobs SET status = 'pending', locked_until = NULL, error = ?, available_at = ? WHERE id = ?",
+            (error, time.time() + 2 ** attempts, job_id),
+        )
+
+    def _finish(self, job_id, attempts, error):
+        try:
+            if error is None:
+                self._complete(job_id)
+            else:
+                logger.error("Error al procesar el trabajo", extra={"ctx": {"job_id": job_id, "attempts": attempts, "error": str(error)}})
+                self._fail(job_id, attempts, str(error))
+        except Exception as e:
+            logger.error("No se pudo actualizar el trabajo", extra={"ctx": {"job_id": job_id, "error": str(e)}})
+
+    def _purge(self):
+        self._connect().execute(
+            "DELETE FROM jobs WHERE status IN ('done', 'failed') AND created_at < ?",
+            (time.time() - self.retention_seconds,),
+        )
+
+    def _worker_loop(self):
+        last_purge = 0.0
+        while True:
+            try:
+                if time.monotonic() - last_purge > 3600:
+                    self._purge()
+                    last_purge = time.monotonic()
+
+                row = self._claim()
+                if row is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+
+                job_id, payload, attempts = row
+                try:
+                    result = self.handler(json.loads(payload))
+                except Exception as e:
+                    self._finish(job_id, attempts + 1, e)
+                    continue
+
+                if isinstance(result, Future):
+                    # El trabajo sigue reclamado hasta que el Future se resuelva
+                    result.add_done_callback(
+                        lambda future, job_id=job_id, attempts=attempts: self._finish(job_id, attempts + 1, future.exception())
+                    )
+                else:
+                    self._finish(job_id, attempts + 1, None)
+            except Exception:
+                logger.exception("Error en la cola de webhooks")
+                time.sleep(self.poll_interval)
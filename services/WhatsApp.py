@@ -1,9 +1,11 @@
-import requests
 from datetime import datetime, timedelta, timezone
 import json
 
 import sys
 
+from services.HttpTransport import get_session
+from services.Metrics import medir
+
 class AuthenticationError(Exception):
     pass
 
@@ -33,6 +35,7 @@ class WhatsApp_Manager:
             "text": {"body": message}
         }
 
-        response = requests.post(self.base_url, headers=headers, data=json.dumps(payload))
+        with medir("whatsapp", operation="send_message"):
+            response = get_session().post(self.base_url, headers=headers, data=json.dumps(payload))
         return response
     
\ No newline at end of file
@@ -0,0 +1,310 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from services.Logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _rechazado(result):
+    # Airtable rechazó el registro (ID inexistente, campo o valor inválido): reenviarlo no sirve
+    status = result.get("status")
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+class WriteBehindQueue:
+    def __init__(self, path, table_name="Clientes", interval=2.0, max_batch=100, max_attempts=10, lease=120.0):
+        """
+        Escritura diferida de actualizaciones de registros de Airtable.
+
+        Las actualizaciones se confirman de inmediato y se guardan en SQLite (modo WAL),
+        fusionando los campos pendientes por ID de registro. Un hilo de fondo las envía
+        en lotes (`update_records`) cada `interval` segundos, al pedirlo con `kick()` y
+        al terminar el proceso. Cada worker reserva los registros que envía (`lease`) para
+        que otro worker no mande los mismos cambios a la vez.
+
+        Si Airtable rechaza un lote (4xx), sus registros se reenvían uno por uno para
+        separar los inválidos, que pasan a estado fallido y dejan de reintentarse. Los
+        demás errores se reintentan hasta `max_attempts` veces.
+
+        Args:
+            path (str): Ruta del archivo SQLite donde se guardan los cambios pendientes.
+            table_name (str): Tabla de Airtable a la que pertenecen los registros.
+            interval (float): Segundos máximos que un cambio espera antes de enviarse.
+            max_batch (int): Número máximo de registros por envío.
+            max_attempts (int): Envíos fallidos tras los cuales un registro se da por fallido.
+            lease (float): Segundos que un worker reserva los registros que está enviando.
+        """
+        self.path = path
+        self.table_name = table_name
+        self.interval = interval
+        self.max_batch = max_batch
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self.manager = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pending_updates (
+                table_name TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                created_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                failed_at REAL,
+                lease_until REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (table_name, record_id)
+            )
+            """
+        )
+
+    def bind(self, manager):
+        """
+        Asocia el gestor de Airtable que envía los cambios.
+
+        Args:
+            manager (AirtablePATManager): Gestor con `update_records`.
+        """
+        self.manager = manager
+        self._ensure_started()
+
+    def _ensure_started(self):
+        # Se inicia en cada worker después del fork
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._flush_loop, name="write-behind", daemon=True).start()
+            if self._pid is None:
+                atexit.register(self._flush_at_exit)
+            self._pid = os.getpid()
+
+    def enqueue(self, record_id, fields):
+        """
+        Registra una actualización pendiente, fusionándola con las anteriores del mismo registro.
+
+        Args:
+            record_id (str): ID del registro.
+            fields (dict): Campos y valores a actualizar.
+
+        Returns:
+            dict: Campos pendientes del registro tras la fusión.
+        """
+        self._ensure_started()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT fields, failed_at FROM pending_updates WHERE table_name = ? AND record_id = ?",
+                (self.table_name, record_id),
+            ).fetchone()
+            # Los campos de un envío fallido no se mezclan con los nuevos
+            merged = {**(json.loads(row[0]) if row and row[1] is None else {}), **fields}
+            conn.execute(
+                """
+                INSERT INTO pending_updates (table_name, record_id, fields, created_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (table_name, record_id)
+                DO UPDATE SET fields = excluded.fields, version = version + 1,
+                    attempts = CASE WHEN failed_at IS NULL THEN attempts ELSE 0 END,
+                    last_error = CASE WHEN failed_at IS NULL THEN last_error END,
+                    failed_at = NULL
+                """,
+                (self.table_name, record_id, json.dumps(merged, ensure_ascii=False), time.time()),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return merged
+
+    def pending(self, record_id):
+        """
+        Devuelve los campos aún no enviados de un registro.
+
+        Args:
+            record_id (str): ID del registro.
+
+        Returns:
+            dict: Campos pendientes (vacío si no hay).
+        """
+        row = self._connect().execute(
+            "SELECT fields FROM pending_updates WHERE table_name = ? AND record_id = ? AND failed_at IS NULL",
+            (self.table_name, record_id),
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def failed(self):
+        """
+        Devuelve las actualizaciones que Airtable rechazó o que agotaron sus intentos.
+
+        Returns:
+            list: Diccionarios con 'id', 'fields', 'attempts', 'error' y 'failed_at'.
+        """
+        rows = self._connect().execute(
+            """
+            SELECT record_id, fields, attempts, last_error, failed_at FROM pending_updates
+            WHERE table_name = ? AND failed_at IS NOT NULL ORDER BY failed_at
+            """,
+            (self.table_name,),
+        ).fetchall()
+        return [
+            {"id": record_id, "fields": json.loads(fields), "attempts": attempts, "error": error, "failed_at": failed_at}
+            for record_id, fields, attempts, error, failed_at in rows
+        ]
+
+    def kick(self):
+        """Pide al hilo de fondo que envíe los cambios pendientes sin esperar al intervalo."""
+        if self._pid == os.getpid():
+            self._wake.set()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Error al enviar actualizaciones diferidas")
+
+    def _flush_at_exit(self):
+        try:
+            # Sin ThreadPoolExecutor: al terminar el intérprete ya no acepta tareas nuevas
+            self.flush(max_workers=1)
+        except Exception:
+            logger.exception("Error al enviar actualizaciones diferidas al terminar")
+
+    def _claim(self):
+        # Reserva un lote de registros pendientes que ningún otro worker esté enviando
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """
+                SELECT record_id, fields, version, attempts FROM pending_updates
+                WHERE table_name = ? AND failed_at IS NULL AND lease_until < ?
+                ORDER BY created_at LIMIT ?
+                """,
+                (self.table_name, now, self.max_batch),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE pending_updates SET lease_until = ? WHERE table_name = ? AND record_id = ?",
+                [(now + self.lease, self.table_name, record_id) for record_id, *_ in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _release(self, rows, done, rejected, errors):
+        # Registra el resultado del envío y libera la reserva de los registros que quedan
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Solo se borra si no llegaron cambios nuevos durante el envío
+            conn.executemany(
+                "DELETE FROM pending_updates WHERE table_name = ? AND record_id = ? AND version = ?",
+                [(self.table_name, record_id, version) for record_id, version in done],
+            )
+            conn.executemany(
+                """
+                UPDATE pending_updates SET attempts = attempts + 1, last_error = ?, failed_at = ?
+                WHERE table_name = ? AND record_id = ?
+                """,
+                [(error, now, self.table_name, record_id) for record_id, error in rejected],
+            )
+            conn.executemany(
+                """
+                UPDATE pending_updates SET attempts = attempts + 1, last_error = ?,
+                    failed_at = CASE WHEN attempts + 1 >= ? THEN ? END
+                WHERE table_name = ? AND record_id = ?
+                """,
+                [(error, self.max_attempts, now, self.table_name, record_id) for record_id, error in errors],
+            )
+            conn.executemany(
+                "UPDATE pending_updates SET lease_until = 0 WHERE table_name = ? AND record_id = ?",
+                [(self.table_name, record_id) for record_id, *_ in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def flush(self, max_workers=3):
+        """
+        Envía a Airtable los cambios pendientes que ningún otro worker esté enviando.
+
+        Args:
+            max_workers (int): Lotes de 10 registros enviándose a la vez (1 = en el hilo actual).
+
+        Returns:
+            int: Número de registros actualizados.
+        """
+        if self.manager is None:
+            return 0
+        sent = 0
+        while True:
+            rows = self._claim()
+            if not rows:
+                return sent
+
+            try:
+                records = [{"id": record_id, "fields": json.loads(fields)} for record_id, fields, *_ in rows]
+                results = self.manager.update_records(self.table_name, records, max_workers=max_workers)
+                # Airtable rechaza el lote completo si un registro es inválido; se reenvían
+                # uno por uno para que los válidos de ese lote sí se guarden
+                for i, result in enumerate(results):
+                    if _rechazado(result):
+                        results[i] = self.manager.update_records(self.table_name, [records[i]], max_workers=1)[0]
+            except Exception:
+                self._release(rows, [], [], [])
+                raise
+
+            done, rejected, errors = [], [], []
+            exhausted = []
+            for (record_id, _, version, attempts), result in zip(rows, results):
+                if "error" not in result:
+                    done.append((record_id, version))
+                elif _rechazado(result):
+                    rejected.append((record_id, result["error"]))
+                else:
+                    errors.append((record_id, result["error"]))
+                    if attempts + 1 >= self.max_attempts:
+                        exhausted.append((record_id, result["error"]))
+            self._release(rows, done, rejected, errors)
+            sent += len(done)
+
+            for record_id, error in rejected:
+                logger.error("Airtable rechazó una actualización diferida", extra={"ctx": {"table": self.table_name, "record_id": record_id, "error": error}})
+            for record_id, error in exhausted:
+                logger.error("Actualización diferida sin enviar tras agotar los intentos", extra={"ctx": {"table": self.table_name, "record_id": record_id, "error": error}})
+            if errors:
+                logger.warning("Quedan actualizaciones diferidas pendientes", extra={"ctx": {"table": self.table_name, "failed": len(errors)}})
+                return sent